@@ -1,5 +1,6 @@
 import os
 import random
+import sys
 import time
 
 from altwalker.planner import OnlinePlanner
@@ -8,6 +9,15 @@ from altwalker.reporter import FileReporter, ClickReporter, Reporter, Reporting
 from altwalker.walker import Walker
 from altwalker.graphwalker import GraphWalkerClient, GraphWalkerService
 
+## Add parent directory to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+from mbt_tools.graphwalker import PooledGraphWalkerClient
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.replay import ReplayPlanner, WalkRecorder, read_recording
+from mbt_tools.services import ManagedGraphWalkerService
+from mbt_tools.executor import create_dispatch_executor
+from mbt_tools.walker import BatchWalker
+
 start_time = time.time()
 
 current_directory = os.getcwd()
@@ -16,12 +26,23 @@ model_path_abs = os.path.join(current_directory, model_path_rel)
 
 ## Initialie AltWalker API objects
 stop_condition = "weighted_random(requirement_coverage(100))"
-port = 6000
-gw_client = GraphWalkerClient(host='127.0.0.1', verbose=False, port=port)
-gw_service = GraphWalkerService(models=[(model_path_abs, stop_condition)], port=port)
-
-planner = OnlinePlanner(client=gw_client, service=gw_service)
-executor = create_executor(path="tests", executor_type='python', url="http://localhost:5000")
+bool_local_planner = False # True: plan test paths in Python with LocalPlanner, without a GraphWalker service
+bool_record = False # True: record the walk to recording_file
+bool_replay = False # True: walk the path of recording_file again, without GraphWalker, e.g. after the SUT changed
+recording_file = 'walk.json.gz'
+if bool_replay:
+    gw_service = None
+    planner = ReplayPlanner(read_recording(recording_file)) # Stops when a recorded guard does not hold anymore
+elif bool_local_planner:
+    gw_service = None
+    planner = LocalPlanner(models=[(model_path_abs, stop_condition)])
+else:
+    gw_service = ManagedGraphWalkerService(models=[(model_path_abs, stop_condition)]) # Leases a free port
+    gw_client = PooledGraphWalkerClient(host='127.0.0.1', verbose=False, port=gw_service.port) # Reuses one TCP/IP connection
+    planner = OnlinePlanner(client=gw_client, service=gw_service)
+if bool_record:
+    planner = WalkRecorder(planner, models=[(model_path_abs, stop_condition)])
+executor = create_dispatch_executor(path="tests") # Test methods are looked up once; empty ones are skipped
 
 bool_print_paths = True
 reporter_standard = ClickReporter() if bool_print_paths else Reporter()
@@ -30,7 +51,7 @@ reporter = Reporting()  # Combines multiple reporters
 reporter.register("standard", reporter_standard)
 reporter.register("to file", reporter_to_file)
 
-walker = Walker(planner, executor, reporter)
+walker = BatchWalker(planner, executor, reporter) # Runs of determined steps are planned at once
 
 ## Define properties of servers that can be tested
 passport_check = {
@@ -65,7 +86,7 @@ seed_SUT = 77 # Seed used by SUT
 server_under_test = passenger_scan # SELECT SERVER TO BE TESTED
 show_messages = False # Show messages from SUT
 
-## Set experimental setup in SUT via graph
+## Set experimental setup in SUT via graph (a replay starts with the recorded values; other values may diverge)
 planner.set_data('bool_from_CLI', False) # Indicate that initial values are set by test execution script
 planner.set_data('seed', seed_SUT)
 planner.set_data('t_end', t_end)
@@ -76,7 +97,10 @@ planner.set_data('show_messages', show_messages)
 
 ## Run test model, then end Java process
 walker.run()
-gw_service.kill()
+if bool_record:
+    planner.save(recording_file)
+if gw_service:
+    gw_service.kill()
 
 end_time = time.time()
 execution_time = end_time - start_time
@@ -357,7 +357,7 @@ class Passenger(mesa.Agent):
         self.walking_speed = stats.uniform(0.611, scale=0.777-0.611).rvs()
         self.bool_needs_manual_check = stats.uniform(0,1).rvs() <= self.model.probability_manual_check
 
-        self.actions = iter(PassengerAction)
+        self.actions = iter(list(PassengerAction)) # A list iterator can be pickled, see checkpoint_sut in test.py
         self.go_to_next_action()
 
         self.service_time = 0
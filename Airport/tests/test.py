@@ -1,17 +1,40 @@
 import unittest
-import warnings
 import logging
+import numpy as np
+import os
+import sys
+
+## Add root of repository to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from mbt_tools.diagnostics import Diagnostics
+from mbt_tools.profiling import sut_advance
 
 # from . import Two_server_ABM_better as SUT # Import SUT from current folder, the 'tests' folder
 from . import Airport as SUT
 model1 = SUT.Airport(seed=1, logger_level=logging.WARN, show_messages=True)
 # Change logger_level to logging.INFO for more info from SUT
+diagnostics = Diagnostics(max_examples=5) # Counts of messages per category, summarized at the end of the run
 
 def setUpRun():
     pass
 
 def tearDownRun():
-    pass
+    diagnostics.emit()
+
+## Checkpoints, see mbt_tools.checkpoint
+def checkpoint_sut():
+    # Pickled with the test instances, so 'self.component' stays a component of model1.
+    # Distributions of scipy.stats draw from NumPy's global generator, so its state is saved too
+    return model1, np.random.get_state()
+
+def restore_sut(state, instances):
+    global model1
+    model1, random_state = state
+    np.random.set_state(random_state)
+    # Unpickled distributions have a copy of the global generator: let them use the global generator again
+    for component in list(vars(model1).values()) + list(model1.schedule.agents):
+        if hasattr(component, 'distribution'):
+            component.distribution.random_state = None
 
 def name_in_list(name, list):
     """
@@ -29,7 +52,8 @@ def name_in_list(name, list):
 
 def time_advance(self, data):
     ## First advance time once
-    model1.step() # Advance time
+    with sut_advance(): # Counted as SUT time when the run is profiled
+        model1.step() # Advance time
     self.time += 1
     # print(f"t = {self.time}, d= {int(data['d'])}")  # debug
     i = 0 # Keep count of consecutive time advancement
@@ -39,7 +63,8 @@ def time_advance(self, data):
 
     ## Check for messages for component
     while not name_in_list(self.component_name, model1.messages):
-        model1.step() # If no messages, keep advancing time
+        with sut_advance():
+            model1.step() # If no messages, keep advancing time
         i = i+1
         self.time += 1
         # print(f"t = {self.time}, d= {int(data['d'])}") # debug
@@ -48,7 +73,7 @@ def time_advance(self, data):
             # print(f"t = {self.time}, time since new service:{self.time_since_new_service}") # Debug
         # warnings.warn(f'{self.time}: NO MESSAGE, TIME ADVANCED')
         if i > 1500: # Prevent infinite while-loop
-            warnings.warn('No messages to server for too long.')
+            diagnostics.note('no messages', 'No messages to server {} for too long.', self.component_name)
             break
     else: # If there is a message, process it
         ## Get number of arrivals and departures from SUT
@@ -57,13 +82,13 @@ def time_advance(self, data):
         for item in model1.messages:
             if self.component_name in item:
                 if 'arrival' in item:
-                    warnings.warn(f'{self.time}: ARRIVAL {self.component_name}')
+                    diagnostics.note('arrival', '{}: ARRIVAL {}', self.time, self.component_name)
                     S1_arrivals += 1
                     self.total_arrivals += 1
                     self.timestamps_arrivals.append(model1.schedule.time)
 
                 if 'departure' in item:
-                    warnings.warn(f'{self.time}: DEPARTURE {self.component_name}')
+                    diagnostics.note('departure', '{}: DEPARTURE {}', self.time, self.component_name)
                     S1_departures +=1
                     self.total_departures += 1
 
@@ -299,15 +324,14 @@ class Server_with_queue(unittest.TestCase):
         """
         pass
 
-## Unlikely edges: raise warning
+## Unlikely edges: note in diagnostics
     def e_two_arrivals(self):
         """
         A --> C
         Guard: a==2 && d==0
         No action in graph
         """
-        warnings.warn('Two arrivals in one time step. \n'+
-                      print_values(self))
+        diagnostics.note('two arrivals', lambda: 'Two arrivals in one time step. \n' + print_values(self))
 
     def e_two_arrivals_to_qZ(self):
         """
@@ -315,8 +339,7 @@ class Server_with_queue(unittest.TestCase):
         Guard: a==2 && d==0
         No action in graph
         """
-        warnings.warn('Two arrivals in one time step. \n' +
-                      print_values(self))
+        diagnostics.note('two arrivals', lambda: 'Two arrivals in one time step. \n' + print_values(self))
 
     def e_a2_d1(self):
         """
@@ -324,8 +347,8 @@ class Server_with_queue(unittest.TestCase):
         Guard: a==2 && d==1
         One must enter service
         """
-        warnings.warn('Two arrivals and one departure in one time step \n' +
-                      print_values(self))
+        diagnostics.note('two arrivals, one departure',
+                         lambda: 'Two arrivals and one departure in one time step \n' + print_values(self))
         # !! Enter service
 
     def e_a2_d1_to_qZ(self):
@@ -335,8 +358,8 @@ class Server_with_queue(unittest.TestCase):
         Action: q++
         One must enter service
         """
-        warnings.warn('Two arrivals and one departure in one time step \n' +
-                      print_values(self))
+        diagnostics.note('two arrivals, one departure',
+                         lambda: 'Two arrivals and one departure in one time step \n' + print_values(self))
         ## !! Enter service
 
 ## Impossible edges: raise exception
@@ -0,0 +1,114 @@
+"""
+Analysis of the results of multiple test runs of the M/M/1 queue.
+Used by the test execution scripts for batch runs and parallel runs.
+The stopping rule for sequential replications (enough_replications) is used by the batch script.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def analyse_results(df_settings, df_outputs, min_perc_within_bandwidth_occupancy, min_perc_within_bandwidth_delta_relative):
+    """
+    Compare results of all runs to analytical solutions, and print verdicts.
+    :param df_settings: (DataFrame) experiment, replication, iat and server_time per run
+    :param df_outputs: (DataFrame) graph variables at end of each run, in the same order as df_settings
+    :param min_perc_within_bandwidth_occupancy: % of occupancy values that should be within bandwidth of analytical solution
+    :param min_perc_within_bandwidth_delta_relative: % of delta-relative values that should be within bandwidth
+    :return: (DataFrame) settings and results per run, (str) overall verdict
+    """
+    df_settings = df_settings.reset_index(drop=True)
+    df_outputs = df_outputs.reset_index(drop=True)
+    df_settings['rho_analytical'] = df_settings['server_time'] / df_settings['iat']
+    df_results = pd.concat([df_settings, df_outputs], axis=1)
+    print(df_results)
+
+    # Get percentage of runs that have good occupancy values according to test script
+    occupancy_value_counts = df_results['occupancy_verdict'].value_counts(normalize=True)
+    if 'passed' in occupancy_value_counts:
+        occupancy_perc_passed = occupancy_value_counts['passed'] * 100
+    else:
+        occupancy_perc_passed = 0
+
+    # Get mean of means for occupancy per experiment
+    df_results['occupancy_mean'] = pd.to_numeric(df_results['occupancy_mean'], errors='coerce')
+    rho_series = df_results.groupby('experiment')['rho_analytical'].first()
+    occupancy_means = df_results.groupby('experiment')['occupancy_mean'].mean()
+    occupancy_means_series = pd.concat([rho_series, occupancy_means], axis=1)
+
+    # Check if values have variance
+    occupancy_has_no_variance = df_results['occupancy_mean'].var() == 0
+    if occupancy_has_no_variance:
+        raise Exception(
+            "No variance in mean occupancy values over time across different runs. Seed is probably not implemented well in SUT.")
+
+    # Get fraction of runs that have good delta values according to test script
+    delta_relative_value_counts = df_results['delta_relative_verdict'].value_counts(normalize=True)
+    if 'passed' in delta_relative_value_counts:
+        delta_relative_perc_passed = delta_relative_value_counts['passed'] * 100
+    else:
+        delta_relative_perc_passed = 0
+
+    ## Make verdicts
+    verdict = 'PASSED'
+
+    # Percentage of runs where occupancy was within accepted range of analytical solution
+    if occupancy_perc_passed >= min_perc_within_bandwidth_occupancy: # 40% of runs should be within accepted range
+        msg = f"Experiments PASSED: {occupancy_perc_passed} % of runs has occupancy value within bandwidth. Required was {min_perc_within_bandwidth_occupancy}"
+    else:
+        msg = f"Experiments FAILED: {occupancy_perc_passed} % of runs has occupancy value within bandwidth. Required was {min_perc_within_bandwidth_occupancy}"
+        verdict = 'FAILED'
+    print(msg)
+
+    # Means of means of occupancy per experiment
+    print("Means of means of occupancy, compared to analytical value:")
+    print(occupancy_means_series)
+
+    # Percentage of runs where deviation from Little's law (|W - L / lambda) / W) < 1 %
+    if delta_relative_perc_passed < min_perc_within_bandwidth_delta_relative:
+        msg = f"Experiment FAILED: Not {min_perc_within_bandwidth_delta_relative} % of relative delta values are within accepted range, only {delta_relative_perc_passed} %. Required was {min_perc_within_bandwidth_delta_relative} %."
+        verdict = 'FAILED'
+    else:
+        msg = f"Experiment PASSED. {delta_relative_perc_passed} % of delta values are within accepted range."
+
+    print(msg)
+    print(f"Overall verdict of analysis of results: {verdict}")
+
+    return df_results, verdict
+
+
+## Sequential replications: replications of an experiment are added until the confidence intervals are narrow enough
+def confidence_half_width(values, confidence_level=0.95):
+    """
+    :param values: list of the values of an output, one per replication; NaN values are left out
+    :return: (float) half-width of the Student-t confidence interval of the mean; inf for less than 2 values
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        return float('inf')
+    return float(stats.t.ppf((1 + confidence_level) / 2, len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values)))
+
+
+def pair_means(values):
+    """:return: (list) means of consecutive pairs of values, e.g. of antithetic replications; an odd last value is left out"""
+    return [(values[index] + values[index + 1]) / 2 for index in range(0, len(values) - 1, 2)]
+
+
+def enough_replications(outputs, target_half_widths, confidence_level=0.95, min_replications=5, antithetic=False):
+    """
+    Stopping rule for the replications of one experiment.
+    :param outputs: (dict) name of output: list of its values in the replications so far
+    :param target_half_widths: (dict) name of output: half-width that its confidence interval should be within
+    :param min_replications: (int) minimum number of replications, also when the intervals are narrow already
+    :param antithetic: (bool) replications are antithetic pairs: the intervals are those of the means of the pairs,
+        which are independent, and only a complete pair can be the last replication
+    :return: (bool) True if the confidence intervals of all outputs are narrow enough, (dict) their half-widths
+    """
+    if antithetic:
+        outputs = {name: pair_means(values) for name, values in outputs.items()}
+    half_widths = {name: confidence_half_width(outputs[name], confidence_level) for name in target_half_widths}
+    num_replications = min(len(values) for values in outputs.values()) * (2 if antithetic else 1)
+    enough = num_replications >= min_replications and \
+        all(half_widths[name] <= target for name, target in target_half_widths.items())
+    return enough, half_widths
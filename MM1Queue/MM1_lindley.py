@@ -0,0 +1,170 @@
+"""
+M/M/1 queue computed with NumPy for many replications at once, as a reference for the Salabim model in MM1_new.
+Waiting times follow from the Lindley recursion W_i = max(0, W_(i-1) + S_(i-1) - X_(i-1)), which is solved for all
+customers at once with cumulative sums: W_n = P_n - min(P_0, ..., P_n), with P_n the sum of S_(i-1) - X_(i-1).
+The outputs have the semantics of make_outputs in MM1_new, at simulation time t_end:
+- L_q, L: time-average number in queue and in system, over [0, t_end]
+- W_q: mean waiting time of the customers that left the queue (zero waits included), as 'length_of_stay'
+- W: W_q plus the mean service time of the customers that left service
+- occupancy: time-average fraction of the server that is claimed
+
+    python MM1_lindley.py --t-end 100 --replications 10000    # Reference thresholds for MM1_test_execution_batch.py
+    python MM1_lindley.py --check                              # Compare with Salabim on the same random numbers
+"""
+import argparse
+
+import numpy as np
+
+MAX_BATCH_VALUES = 4000000 # Maximum number of customers x replications in memory at once
+
+
+def lindley_waiting_times(inter_arrival_times, service_times):
+    """
+    :param inter_arrival_times: (np.ndarray) shape (replications, customers); the first customer arrives at time 0
+    :param service_times: (np.ndarray) same shape
+    :return: (np.ndarray) waiting time in the queue of every customer
+    """
+    increments = service_times[:, :-1] - inter_arrival_times[:, :-1]
+    partial_sums = np.concatenate([np.zeros((len(increments), 1)), np.cumsum(increments, axis=1)], axis=1)
+    return partial_sums - np.minimum.accumulate(partial_sums, axis=1) # P_0 = 0, so the minimum is at most 0
+
+
+def make_outputs_lindley(inter_arrival_times, service_times, t_end):
+    """
+    Outputs of make_outputs in MM1_new, for every replication.
+    :param t_end: (float) simulation time at which the outputs are taken
+    :return: (dict) arrays 'L', 'L_q', 'W', 'W_q' and 'occupancy', one value per replication
+    """
+    arrivals = np.concatenate([np.zeros((len(inter_arrival_times), 1)),
+                               np.cumsum(inter_arrival_times[:, :-1], axis=1)], axis=1)
+    starts = arrivals + lindley_waiting_times(inter_arrival_times, service_times)
+    departures = starts + service_times
+
+    # Time in queue and in service within [0, t_end]
+    L_q = np.sum(np.minimum(starts, t_end) - np.minimum(arrivals, t_end), axis=1) / t_end
+    L_s = np.sum(np.minimum(departures, t_end) - np.minimum(starts, t_end), axis=1) / t_end
+
+    # Lengths of stay are counted when customers leave the queue or the server
+    left_queue = starts <= t_end
+    left_service = departures <= t_end
+    with np.errstate(invalid='ignore'): # No customer left: NaN, as the mean of an empty monitor
+        W_q = np.sum(np.where(left_queue, starts - arrivals, 0), axis=1) / np.sum(left_queue, axis=1)
+        W_s = np.sum(np.where(left_service, service_times, 0), axis=1) / np.sum(left_service, axis=1)
+
+    return {'L': L_q + L_s, 'L_q': L_q, 'W': W_q + W_s, 'W_q': W_q, 'occupancy': L_s}
+
+
+def simulate(iat, server_time, t_end, num_replications, seed=None):
+    """
+    Run replications of the M/M/1 queue until t_end.
+    :param iat: (float) mean inter-arrival time
+    :param server_time: (float) mean service time
+    :param seed: seed of NumPy's random generator
+    :return: (dict) arrays of outputs, see make_outputs_lindley
+    """
+    rng = np.random.default_rng(seed)
+    mean_arrivals = t_end / iat
+    num_customers = int(mean_arrivals + 8 * np.sqrt(mean_arrivals) + 20) # Enough to pass t_end, almost always
+    batch_size = max(1, MAX_BATCH_VALUES // num_customers)
+
+    outputs = []
+    for first in range(0, num_replications, batch_size):
+        size = min(batch_size, num_replications - first)
+        inter_arrival_times = rng.exponential(iat, (size, num_customers))
+        while np.any(np.sum(inter_arrival_times[:, :-1], axis=1) <= t_end): # Arrivals must pass t_end
+            inter_arrival_times = np.concatenate([inter_arrival_times, rng.exponential(iat, (size, num_customers))],
+                                                 axis=1)
+        service_times = rng.exponential(server_time, inter_arrival_times.shape)
+        outputs.append(make_outputs_lindley(inter_arrival_times, service_times, t_end))
+    return {key: np.concatenate([output[key] for output in outputs]) for key in outputs[0]}
+
+
+def deviations(outputs, iat, server_time):
+    """
+    Deviations from the analytical solution, as computed in tearDownModel of the test package.
+    :return: (dict) arrays 'occupancy_deviation_relative' and 'delta_relative', in %
+    """
+    lambd = 1 / iat
+    rho = server_time / iat
+    delta = np.abs(outputs['W'] - outputs['L'] / lambd) # Little's law
+    return {'occupancy_deviation_relative': np.abs((rho - outputs['occupancy']) / rho) * 100,
+            'delta_relative': delta / outputs['W'] * 100}
+
+
+def reference_thresholds(iat, server_time, t_end, num_replications=10000, quantile=0.95, seed=None):
+    """
+    Deviations that a correct M/M/1 queue stays within, in a fraction 'quantile' of the replications.
+    :return: (dict) values for 'accepted_deviation_occupancy' and 'accepted_deviation_delta_relative' (in %)
+    """
+    deviation = deviations(simulate(iat, server_time, t_end, num_replications, seed), iat, server_time)
+    return {'accepted_deviation_occupancy': np.nanquantile(deviation['occupancy_deviation_relative'], quantile),
+            'accepted_deviation_delta_relative': np.nanquantile(deviation['delta_relative'], quantile)}
+
+
+## Cross-check with the Salabim model
+class _RecordedDistribution:
+    """Distribution that keeps the values that were sampled"""
+    def __init__(self, distribution):
+        self.distribution = distribution
+        self.samples = []
+
+    def sample(self):
+        value = self.distribution.sample()
+        self.samples.append(value)
+        return value
+
+
+def cross_check(iat, server_time, t_end, seed):
+    """
+    Run MM1_new.MM1Model until t_end, and compute its outputs again from the same inter-arrival and service times.
+    :return: (tuple) outputs of make_outputs (without occupancy data) and of make_outputs_lindley, as dicts
+    """
+    import MM1_new as MM1
+    model = MM1.MM1Model(iat=iat, server_time=server_time, seed=seed)
+    model.inter_arrival_time_dis = _RecordedDistribution(model.inter_arrival_time_dis)
+    model.service_duration_dis = _RecordedDistribution(model.service_duration_dis)
+    model.env.run(till=t_end)
+    L, L_q, W, W_q, occupancy, occupancy_data = MM1.make_outputs(model.clerks)
+
+    # Customers are served in order of arrival (FIFO); the ones that did not start service get a service time
+    inter_arrival_times = np.array(model.inter_arrival_time_dis.samples)
+    service_times = np.array(model.service_duration_dis.samples)
+    service_times = np.concatenate([service_times, np.full(len(inter_arrival_times) - len(service_times), np.inf)])
+    lindley = make_outputs_lindley(inter_arrival_times[np.newaxis], service_times[np.newaxis], t_end)
+    return ({'L': L, 'L_q': L_q, 'W': W, 'W_q': W_q, 'occupancy': occupancy},
+            {key: value[0] for key, value in lindley.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="M/M/1 queue with the Lindley recursion, in NumPy")
+    parser.add_argument('--iat', type=float, default=1.0, help="mean inter-arrival time")
+    parser.add_argument('--server-times', type=float, nargs='+', default=list(np.linspace(0.2, 0.9, 8)),
+                        help="mean service times (default: those of MM1_test_execution_batch.py)")
+    parser.add_argument('--t-end', type=float, default=100, help="simulation end time")
+    parser.add_argument('--replications', type=int, default=10000)
+    parser.add_argument('--quantile', type=float, default=0.95, help="fraction of correct replications that pass")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', action='store_true', help="compare with the Salabim model instead")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        print(f"{'server_time':>12}{'output':>11}{'Salabim':>14}{'Lindley':>14}")
+        for server_time in args.server_times:
+            salabim_outputs, lindley_outputs = cross_check(args.iat, server_time, args.t_end, args.seed or 1)
+            for key in salabim_outputs:
+                print(f"{server_time:>12.2f}{key:>11}{salabim_outputs[key]:>14.8f}{lindley_outputs[key]:>14.8f}")
+        return
+
+    print(f"Deviations within which {args.quantile * 100:g} % of {args.replications} replications stay, "
+          f"t_end = {args.t_end:g}, iat = {args.iat:g}")
+    print(f"{'server_time':>12}{'rho':>8}{'accepted_deviation_occupancy':>30}{'accepted_deviation_delta_relative':>35}")
+    for server_time in args.server_times:
+        thresholds = reference_thresholds(args.iat, server_time, args.t_end, args.replications, args.quantile,
+                                          args.seed)
+        print(f"{server_time:>12.2f}{server_time / args.iat:>8.2f}"
+              f"{thresholds['accepted_deviation_occupancy']:>30.2f}"
+              f"{thresholds['accepted_deviation_delta_relative']:>35.2f}")
+
+
+if __name__ == '__main__':
+    main()
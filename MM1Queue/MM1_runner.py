@@ -0,0 +1,90 @@
+"""
+Parallel execution of test runs of the M/M/1 queue.
+Every (experiment, replication, seed) job is one walk. Jobs are run by a pool of worker processes.
+Each walk has its own SUT (an 'MM1Model' per test instance). Each worker process has its own planner,
+and its own GraphWalker service on a leased port (see 'mbt_tools.services').
+"""
+import multiprocessing.util
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from altwalker.reporter import Reporter, Reporting
+
+## Add parent directory to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+from mbt_tools.graphwalker import ReusableGraphWalkerService
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.reporter import JSONLinesReporter
+from mbt_tools.executor import create_dispatch_executor
+from mbt_tools.walker import BatchWalker
+
+## Get paths
+current_directory = os.getcwd()
+model_path_rel = 'models\MM1_FIFO_with_s_and_fail.json'
+model_path_abs = os.path.join(current_directory, model_path_rel)
+
+## State of one worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(model_path_abs, stop_condition, bool_local_planner):
+    """Start the GraphWalker service and AltWalker executor that this worker uses for all its jobs"""
+    _worker['model_path_abs'] = model_path_abs
+    _worker['stop_condition'] = stop_condition
+    _worker['gw_service'] = None
+    _worker['name'] = f'pid{os.getpid()}'
+    if not bool_local_planner:
+        gw_service = ReusableGraphWalkerService(model_path_abs, stop_condition) # Leases a free port
+        _worker['gw_service'] = gw_service
+        _worker['name'] = f'port{gw_service.service.port}'
+        # Worker processes do not run 'atexit' functions; finalizers of multiprocessing are run
+        multiprocessing.util.Finalize(None, gw_service.kill, exitpriority=10)
+    _worker['executor'] = create_dispatch_executor(path="tests") # Test methods are looked up once; empty ones are skipped
+    _worker['reporter_to_file'] = JSONLinesReporter(f"output_worker_{_worker['name']}.jsonl.gz") # One file per worker
+    multiprocessing.util.Finalize(None, _worker['reporter_to_file'].close, exitpriority=20)
+
+
+def run_replication(job):
+    """
+    Run one walk in a worker process.
+    :param job: (dict) 'experiment', 'replication', and 'graph_data': graph variables to set before the walk
+    :return: (dict) job, and graph variables at the end of the walk
+    """
+    gw_service = _worker['gw_service']
+    if gw_service:
+        gw_service.reset(job['graph_data'])
+        planner = gw_service.planner()
+    else:
+        planner = LocalPlanner(models=[(_worker['model_path_abs'], _worker['stop_condition'])])
+        for key, value in job['graph_data'].items():
+            planner.set_data(key, value)
+
+    reporter = Reporting()
+    reporter.register("standard", Reporter())
+    reporter.register("to file", _worker['reporter_to_file'])
+
+    walker = BatchWalker(planner, _worker['executor'], reporter)
+    walker.run()
+    return {'job': job, 'data': planner.get_data(), 'status': walker.status}
+
+
+def run_parallel(jobs, model_path_abs, stop_condition, num_workers=None, bool_local_planner=False):
+    """
+    Run all jobs with a pool of worker processes.
+    Results are returned in the order of the jobs, regardless of the order in which they complete.
+    :param jobs: list of dicts, see run_replication
+    :param num_workers: (int) number of worker processes, default: number of CPUs
+    :return: (list) results of run_replication, in the order of jobs
+    """
+    num_workers = num_workers or os.cpu_count()
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                             initargs=(model_path_abs, stop_condition, bool_local_planner)) as pool:
+        futures = {pool.submit(run_replication, job): index for index, job in enumerate(jobs)}
+        for num_done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            results[index] = future.result()
+            job = jobs[index]
+            print(f"Done {num_done}/{len(jobs)}: experiment {job['experiment']}, replication {job['replication']}")
+    return results
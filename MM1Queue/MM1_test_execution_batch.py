@@ -3,6 +3,7 @@ import os
 import random
 import time # For getting the execution time
 import pandas as pd
+import sys
 
 from altwalker.planner import OnlinePlanner
 from altwalker.executor import PythonExecutor, create_executor, HttpExecutor, create_python_executor, create_http_executor
@@ -10,42 +11,81 @@ from altwalker.reporter import FileReporter, ClickReporter, Reporter, Reporting
 from altwalker.walker import Walker
 from altwalker.graphwalker import GraphWalkerClient, GraphWalkerService
 
+## Add parent directory to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+from mbt_tools.graphwalker import ReusableGraphWalkerService
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.reporter import AggregatingReporter, JSONLinesReporter, format_summary, merge_summaries
+from mbt_tools.executor import create_dispatch_executor
+from mbt_tools.walker import BatchWalker
+from MM1_analysis import analyse_results, enough_replications
+
 ## Get paths
 current_directory = os.getcwd()
 model_path_rel = 'models\MM1_FIFO_with_s_and_fail.json'
 model_path_abs = os.path.join(current_directory, model_path_rel)
 
 ## Initialize AltWalker API objects
-def create_AltWalker_run(port, model_path_abs, stop_condition, bool_print_paths):
-    gw_client = GraphWalkerClient(host='127.0.0.1', verbose=False, port=port)
-    gw_service = GraphWalkerService(models=[(model_path_abs, stop_condition)], port=port)
+def create_AltWalker_run(gw_service, model_path_abs, stop_condition, bool_print_paths, shared_reporters,
+                         bool_local_planner=False):
+    if bool_local_planner:
+        # Plan test path in Python, without GraphWalker service
+        planner = LocalPlanner(models=[(model_path_abs, stop_condition)])
+    else:
+        gw_service.reset() # Restart walk and graph variables in running GraphWalker service
+        planner = gw_service.planner()
 
-    planner = OnlinePlanner(client=gw_client, service=gw_service)
-    executor = create_executor(path="tests", executor_type='python', url="http://localhost:5000")
+    executor = create_dispatch_executor(path="tests") # Test methods are looked up once; empty ones are skipped
 
     reporter_standard = ClickReporter() if bool_print_paths else Reporter()
-    reporter_to_file = FileReporter('output.txt')
     reporter = Reporting()  # Combines multiple reporters
     reporter.register("standard", reporter_standard)
-    reporter.register("to file", reporter_to_file)
+    for key, shared_reporter in shared_reporters.items(): # Reporters that are shared by all runs
+        reporter.register(key, shared_reporter)
 
-    walker = Walker(planner, executor, reporter)
+    walker = BatchWalker(planner, executor, reporter) # Runs of determined steps are planned at once
 
-    return gw_service, gw_client, planner, executor, reporter, walker
+    return planner, executor, reporter, walker
 
 ## Define experiments
 bool_print_paths = False # True: AltWalker ClickReporter will print all generated steps to stdout
+bool_log_steps = False # True: write every step to output.jsonl.gz. False: only counts and durations per element
+bool_local_planner = False # True: plan test paths in Python with LocalPlanner, without a GraphWalker service
+bool_streaming = False # True: SUT keeps statistics in constant memory, e.g. for a large t_end
+bool_warm_up = False # True: verdicts on statistics after the warm-up period (MSER-5), instead of from t = 0
+bool_control_variates = False # True: verdicts on statistics corrected with control variates (known iat and server_time)
+bool_macro_step = False # True: the SUT advances until the guards of the model change, instead of one event per step
 
-port = 6000
 stop_condition = "weighted_random(requirement_coverage(100) or length(100000))"
 
 t_end = 100 # SUT simulated time to end test at
 num_experiments = 1
 num_replications = 2
+
+# Sequential replications: per experiment, replications are added until the confidence intervals of the outputs are
+# narrower than the targets, between min_replications and max_replications. num_replications is then not used
+bool_sequential = False
+target_half_widths = {'occupancy_mean': 0.01, # Half-width of the confidence interval of the mean occupancy
+                      'delta_relative': 1.0} # Idem, of |(W - L/lambda)/W| in %
+confidence_level = 0.95
+min_replications = 5
+max_replications = 200
+
+# Random numbers. Arrivals and services have a random stream each in the SUT, seeded from the seed of the run
+bool_common_random_numbers = True # True: replication r of every experiment has the same seed, so experiments differ
+                                  # by their parameters only. False: every run has its own seed
+bool_antithetic = False # True: replications in pairs with the same seed; the second uses 1 - u for every random u
+
 random.seed(100) # Initialize RNG
-lst_seeds = [random.randint(0, 1234567) for i in range(num_replications)]
+num_seeds = max_replications if bool_sequential else num_replications
+if bool_antithetic:
+    num_seeds = (num_seeds + 1) // 2 # One seed per pair
+if bool_common_random_numbers:
+    lst_seeds = [[random.randint(0, 1234567) for i in range(num_seeds)]] * num_experiments
+else:
+    lst_seeds = [[random.randint(0, 1234567) for i in range(num_seeds)] for experiment in range(num_experiments)]
 
-# Accepted values for numerical tests against analytical solutions
+# Accepted values for numerical tests against analytical solutions (reference values: see MM1_lindley.py)
 accepted_deviation_occupancy = 3.5 # % deviaton from analytical solution for occupancy (rho)
 accepted_deviation_delta_relative = 2 # % deviation from analytical solution for |(W - L/lambda)/W|
 min_perc_within_bandwidth_occupancy = 50 # % of occupancy values that should be within bandwidth of analytical solution
@@ -60,32 +100,42 @@ input_data_dict = {'iat': lst_iat,
 
 
 ## Initialize dataframe for analysis of multiple runs
-outputs_for_analysis = ['t_end_exact','occupancy_mean','occupancy_verdict','delta_relative','delta_relative_verdict']
+outputs_for_analysis = ['t_end_exact','t_warm_up','occupancy_mean','occupancy_verdict','delta_relative','delta_relative_verdict']
 df_outputs = pd.DataFrame(columns=outputs_for_analysis)
 df_settings = pd.DataFrame(columns=['experiment','replication','iat','server_time'])
 
 start_time = time.time() # To calculate execution time
 
+## Start one GraphWalker service for all runs. The model is loaded once.
+gw_service = None if bool_local_planner else ReusableGraphWalkerService(model_path_abs, stop_condition)
+
+## Reporters for all runs: a summary per run at tearDownModel, and optionally every step
+reporter_summary = AggregatingReporter('summaries.jsonl')
+shared_reporters = {"summary": reporter_summary}
+if bool_log_steps:
+    shared_reporters["to file"] = JSONLinesReporter('output.jsonl.gz') # Steps are written from a background thread
+
 ## Run experiments
+replications_per_experiment = [] # Number of replications, and half-widths of the confidence intervals
 for experiment in range(num_experiments):
-    for replication in range(num_replications):
-            port += 1 # New port number for GraphWalker service
-            gw_service, gw_client, planner, executor, reporter, walker = \
-                create_AltWalker_run(port, model_path_abs, stop_condition, bool_print_paths)
+    experiment_outputs = {name: [] for name in target_half_widths} # Values per replication, for the stopping rule
+    for replication in range(max_replications if bool_sequential else num_replications):
+            seed = lst_seeds[experiment][replication // 2 if bool_antithetic else replication]
+            antithetic = bool_antithetic and replication % 2 == 1
+            planner, executor, reporter, walker = \
+                create_AltWalker_run(gw_service, model_path_abs, stop_condition, bool_print_paths, shared_reporters,
+                                     bool_local_planner)
 
             ## Set seed and experimental set-up via graph
-            planner.set_data('seed', lst_seeds[replication])
+            planner.set_data('seed', seed)
+            planner.set_data('antithetic', antithetic)
             planner.set_data('t_end', t_end)
             planner.set_data('d_rho', accepted_deviation_occupancy)
             planner.set_data('d_delta_relative', accepted_deviation_delta_relative)
-
-            #if (experiment > 0) and (replication > 0):
-            if not (experiment==0 and replication==0):
-                num_steps = int(previous_data['n_advances'])
-                print(f"Number of advances at end of previous run: {num_steps}")
-                planner.set_data('n_advances', num_steps)
-            else:
-                planner.set_data('n_advances', 0)
+            planner.set_data('streaming', bool_streaming)
+            planner.set_data('warm_up', bool_warm_up)
+            planner.set_data('control_variates', bool_control_variates)
+            planner.set_data('macro_step', bool_macro_step)
 
             ## Set input parameters via graph
             for key, value in input_data_dict.items():
@@ -94,7 +144,7 @@ for experiment in range(num_experiments):
             ## Print parameters for this run
             print(f"Experiment num. {experiment}, replication {replication}. \n "
             f"iat = {input_data_dict['iat'][experiment]}, server_time = {input_data_dict['server_time'][experiment]}, "
-                  f"seed = {lst_seeds[replication]}")
+                  f"seed = {seed}{', antithetic' if antithetic else ''}")
 
             df_settings = df_settings.append({'experiment':experiment, 'replication':replication}, ignore_index=True)
             df_settings['iat'] = input_data_dict['iat'][experiment]
@@ -106,66 +156,37 @@ for experiment in range(num_experiments):
             previous_data_filter = {k: v for k, v in previous_data.items() if k in df_outputs.columns}
                 # Filter to relevant outputs
             df_outputs = df_outputs.append(previous_data_filter, ignore_index=True) # Append results f this run
-            gw_service.kill() # End associated Java process
+            if gw_service:
+                connections = gw_service.client.connection_statistics()
+                print(f"Requests to GraphWalker: {connections['requests']}, "
+                      f"of which {connections['connections_reused']} reused an open connection.")
+
+            ## Stop adding replications when the confidence intervals are narrow enough
+            for name in experiment_outputs:
+                experiment_outputs[name].append(float(previous_data.get(name, 'nan')))
+            enough, half_widths = enough_replications(experiment_outputs, target_half_widths, confidence_level,
+                                                      min_replications, bool_antithetic)
+            if bool_sequential and enough:
+                break
+    replications_per_experiment.append({'experiment': experiment, 'replications': replication + 1,
+                                        **{f"half_width_{name}": value for name, value in half_widths.items()}})
+
+if bool_log_steps:
+    shared_reporters["to file"].close() # Write remaining steps to output.jsonl.gz
+for summary in merge_summaries(reporter_summary.summaries): # Steps of all runs per element
+    print(format_summary(summary))
+if gw_service:
+    gw_service.kill() # End associated Java process
 
 pd.set_option('display.max_rows', None)
 pd.set_option('display.max_columns', None)
 
-## Analysis of multiple runs
-df_settings['rho_analytical'] = df_settings['server_time'] / df_settings['iat']
-df_results = pd.concat([df_settings, df_outputs], axis=1)
-print(df_results)
-
-# Get percentage of runs that have good occupancy values according to test script
-occupancy_value_counts = df_results['occupancy_verdict'].value_counts(normalize=True)
-if 'passed' in occupancy_value_counts:
-    occupancy_perc_passed = occupancy_value_counts['passed'] * 100
-else:
-    occupancy_perc_passed = 0
-
-# Get mean of means for occupancy per experiment
-df_results['occupancy_mean'] = pd.to_numeric(df_results['occupancy_mean'], errors='coerce')
-rho_series = df_results.groupby('experiment')['rho_analytical'].first()
-occupancy_means = df_results.groupby('experiment')['occupancy_mean'].mean()
-occupancy_means_series = pd.concat([rho_series, occupancy_means], axis=1)
-
-# Check if values have variance
-occupancy_has_no_variance = df_results['occupancy_mean'].var() == 0
-if occupancy_has_no_variance:
-    raise Exception(
-        "No variance in mean occupancy values over time across different runs. Seed is probably not implemented well in SUT.")
-
-# Get fraction of runs that have good delta values according to test script
-delta_relative_value_counts = df_results['delta_relative_verdict'].value_counts(normalize=True)
-if 'passed' in delta_relative_value_counts:
-    delta_relative_perc_passed = delta_relative_value_counts['passed'] * 100
-else:
-    delta_relative_perc_passed = 0
-
-## Make verdicts
-verdict = 'PASSED'
+## Number of replications per experiment, e.g. to see which experiments needed most replications
+print(pd.DataFrame(replications_per_experiment))
 
-# Percentage of runs where occupancy was within accepted range of analytical solution
-if occupancy_perc_passed >= min_perc_within_bandwidth_occupancy: # 40% of runs should be within accepted range
-    msg = f"Experiments PASSED: {occupancy_perc_passed} % of runs has occupancy value within bandwidth. Required was {min_perc_within_bandwidth_occupancy}"
-else:
-    msg = f"Experiments FAILED: {occupancy_perc_passed} % of runs has occupancy value within bandwidth. Required was {min_perc_within_bandwidth_occupancy}"
-    verdict = 'FAILED'
-print(msg)
-
-# Means of means of occupancy per experiment
-print("Means of means of occupancy, compared to analytical value:")
-print(occupancy_means_series)
-
-# Percentage of runs where deviation from Little's law (|W - L / lambda) / W) < 1 %
-if delta_relative_perc_passed < min_perc_within_bandwidth_delta_relative:
-    msg = f"Experiment FAILED: Not {min_perc_within_bandwidth_delta_relative} % of relative delta values are within accepted range, only {delta_relative_perc_passed} %. Required was {min_perc_within_bandwidth_delta_relative} %."
-    verdict = 'FAILED'
-else:
-    msg = f"Experiment PASSED. {delta_relative_perc_passed} % of delta values are within accepted range."
-
-print(msg)
-print(f"Overall verdict of analysis of results: {verdict}")
+## Analysis of multiple runs
+df_results, verdict = analyse_results(df_settings, df_outputs, min_perc_within_bandwidth_occupancy,
+                                      min_perc_within_bandwidth_delta_relative)
 
 df_results.to_csv('results.csv')
 
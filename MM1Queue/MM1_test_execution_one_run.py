@@ -3,6 +3,7 @@ import os
 import random
 import time # For getting the execution time
 import pandas as pd
+import sys
 
 from altwalker.planner import OnlinePlanner
 from altwalker.executor import PythonExecutor, create_executor, HttpExecutor, create_python_executor, create_http_executor
@@ -10,32 +11,84 @@ from altwalker.reporter import FileReporter, ClickReporter, Reporter, Reporting
 from altwalker.walker import Walker
 from altwalker.graphwalker import GraphWalkerClient, GraphWalkerService
 
+## Add parent directory to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+from mbt_tools.checkpoint import CheckpointWalker, read_checkpoint, restore_planner
+from mbt_tools.graphwalker import PooledGraphWalkerClient
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.profiling import StepProfile
+from mbt_tools.replay import ReplayPlanner, WalkRecorder, read_recording
+from mbt_tools.reporter import JSONLinesReporter
+from mbt_tools.services import ManagedGraphWalkerService
+from mbt_tools.executor import create_dispatch_executor
+from mbt_tools.walker import BatchWalker
+
 ## Get paths
 current_directory = os.getcwd()
 model_path_rel = 'models\MM1_FIFO_with_s_and_fail.json'
 model_path_abs = os.path.join(current_directory, model_path_rel)
 
 ## Initialize AltWalker API objects
-def create_AltWalker_run(port, model_path_abs, stop_condition, bool_print_paths):
-    gw_client = GraphWalkerClient(host='127.0.0.1', verbose=False, port=port)
-    gw_service = GraphWalkerService(models=[(model_path_abs, stop_condition)], port=port)
-
-    planner = OnlinePlanner(client=gw_client, service=gw_service)
-    executor = create_executor(path="tests", executor_type='python', url="http://localhost:5000")
+def create_AltWalker_run(model_path_abs, stop_condition, bool_print_paths, reporter_to_file, bool_local_planner=False,
+                         profile=None, checkpoint_interval=None, bool_resume=False):
+    checkpoint = None
+    if bool_resume:
+        # Continue the walk of the last checkpoint, e.g. after a crash. The planner is restored from the checkpoint
+        checkpoint = read_checkpoint(checkpoint_file)
+        gw_client = None
+        gw_service = None
+        planner = restore_planner(checkpoint)
+    elif bool_replay:
+        # Walk the path of recording_file again, without GraphWalker. Stops when a recorded guard does not hold
+        gw_client = None
+        gw_service = None
+        planner = ReplayPlanner(read_recording(recording_file))
+    elif bool_local_planner:
+        # Plan test path in Python, without GraphWalker service
+        gw_client = None
+        gw_service = None
+        planner = LocalPlanner(models=[(model_path_abs, stop_condition)])
+    else:
+        gw_service = ManagedGraphWalkerService(models=[(model_path_abs, stop_condition)]) # Leases a free port
+        gw_client = PooledGraphWalkerClient(host='127.0.0.1', verbose=False, port=gw_service.port) # Reuses one TCP/IP connection
+        planner = OnlinePlanner(client=gw_client, service=gw_service)
+
+    if bool_record:
+        planner = WalkRecorder(planner, models=[(model_path_abs, stop_condition)]) # Saved after the run
+    executor = create_dispatch_executor(path="tests") # Test methods are looked up once; empty ones are skipped
 
     reporter_standard = ClickReporter() if bool_print_paths else Reporter()
-    reporter_to_file = FileReporter('output.txt')
     reporter = Reporting()  # Combines multiple reporters
     reporter.register("standard", reporter_standard)
     reporter.register("to file", reporter_to_file)
 
-    walker = Walker(planner, executor, reporter)
+    if profile is not None: # Time planner requests, graph variables, test methods and SUT per step
+        planner = profile.planner(planner)
+        executor = profile.executor(executor)
+
+    if checkpoint_interval or checkpoint:
+        # Saves the walk every 'checkpoint_interval' steps. Needs a LocalPlanner
+        walker = CheckpointWalker(planner, executor, reporter, file=checkpoint_file, interval=checkpoint_interval,
+                                  state=checkpoint)
+    else:
+        walker = BatchWalker(planner, executor, reporter) # Runs of determined steps are planned at once
 
     return gw_service, gw_client, planner, executor, reporter, walker
 
 ## Define experiments
 bool_print_paths = True # True: AltWalker ClickReporter will print all generated steps to stdout
-port = 6000
+bool_local_planner = False # True: plan test paths in Python with LocalPlanner, without a GraphWalker service
+bool_profile = False # True: print time per step in planner, graph variables, test methods and SUT
+checkpoint_interval = None # Steps between checkpoints of the walk, e.g. 10000, or None. Needs bool_local_planner
+bool_resume = False # True: continue the walk of checkpoint_file, instead of starting a new walk
+checkpoint_file = 'checkpoint.pkl'
+bool_record = False # True: record the walk to recording_file
+bool_replay = False # True: replay the walk of recording_file without GraphWalker, e.g. after the SUT changed
+recording_file = 'walk.json.gz'
+bool_streaming = False # True: SUT keeps statistics in constant memory, e.g. for a large t_end
+bool_warm_up = False # True: verdicts on statistics after the warm-up period (MSER-5), instead of from t = 0
+bool_control_variates = False # True: verdicts on statistics corrected with control variates (known iat and server_time)
+bool_macro_step = False # True: the SUT advances until the guards of the model change, instead of one event per step
 stop_condition = "weighted_random(requirement_coverage(100) or length(100000))"
 
 t_end = 100 # SUT simulated time to end test at
@@ -49,16 +102,22 @@ server_time = 0.2
 start_time = time.time() # To calculate execution time
 
 ## Run experiments
-port += 1 # New port number for GraphWalker service
+reporter_to_file = JSONLinesReporter('output.jsonl') # Buffered, written from a background thread
+profile = StepProfile() if bool_profile else None
 gw_service, gw_client, planner, executor, reporter, walker = \
-    create_AltWalker_run(port, model_path_abs, stop_condition, bool_print_paths)
+    create_AltWalker_run(model_path_abs, stop_condition, bool_print_paths, reporter_to_file, bool_local_planner,
+                         profile, checkpoint_interval, bool_resume)
 
-## Set seed and experimental set-up via graph
+## Set seed and experimental set-up via graph (when resuming, the graph variables of the checkpoint are used)
 planner.set_data('seed', seed)
 planner.set_data('t_end', t_end)
 
 planner.set_data('iat', iat)
 planner.set_data('server_time', server_time)
+planner.set_data('streaming', bool_streaming)
+planner.set_data('warm_up', bool_warm_up)
+planner.set_data('control_variates', bool_control_variates)
+planner.set_data('macro_step', bool_macro_step)
 
 ## Print parameters for this run
 print(f"One experiment with iat = {iat} and server time = {server_time}, for {t_end} seconds.")
@@ -66,7 +125,14 @@ print(f"One experiment with iat = {iat} and server time = {server_time}, for {t_
 ## Run and reset AltWalker
 walker.run()
 output_data = planner.get_data() # Get graph variables at end of run
-gw_service.kill() # End associated Java process
+reporter_to_file.close() # Write remaining steps to output.jsonl, see mbt_tools.reporter.read_records
+if bool_record:
+    planner.save(recording_file)
+if profile:
+    print(profile.table())
+    profile.write_collapsed('profile.folded') # For flame graphs, e.g. 'flamegraph.pl profile.folded > profile.svg'
+if gw_service:
+    gw_service.kill() # End associated Java process
 
 
 ## Get execution time
@@ -0,0 +1,76 @@
+import numpy as np
+import random
+import time # For getting the execution time
+import pandas as pd
+
+from MM1_analysis import analyse_results
+from MM1_runner import model_path_abs, run_parallel
+
+## Define experiments
+bool_local_planner = False # True: plan test paths in Python with LocalPlanner, without a GraphWalker service
+num_workers = None # Number of worker processes. None: number of CPUs
+
+stop_condition = "weighted_random(requirement_coverage(100) or length(100000))"
+
+t_end = 100 # SUT simulated time to end test at
+num_experiments = 50
+num_replications = 20
+random.seed(100) # Initialize RNG
+lst_seeds = [random.randint(0, 1234567) for i in range(num_replications)]
+
+# Accepted values for numerical tests against analytical solutions
+accepted_deviation_occupancy = 3.5 # % deviaton from analytical solution for occupancy (rho)
+accepted_deviation_delta_relative = 2 # % deviation from analytical solution for |(W - L/lambda)/W|
+min_perc_within_bandwidth_occupancy = 50 # % of occupancy values that should be within bandwidth of analytical solution
+min_perc_within_bandwidth_delta_relative = 50 # % of delta-relative values that should be within bandwidth of analytical solution
+
+## Sample input parameters for experiments
+lst_iat = np.repeat(1.0, num_experiments)
+lst_server_time = np.linspace(0.2, 0.9, num_experiments)
+input_data_dict = {'iat': lst_iat,
+                   'server_time': lst_server_time}
+
+## Columns of dataframes for analysis of multiple runs, as in MM1_test_execution_batch.py
+outputs_for_analysis = ['t_end_exact','occupancy_mean','occupancy_verdict','delta_relative','delta_relative_verdict']
+settings_columns = ['experiment','replication','iat','server_time']
+
+if __name__ == '__main__': # Worker processes import this script, but should not run it
+    start_time = time.time() # To calculate execution time
+
+    ## One job per run, with seed and experimental set-up for the graph
+    jobs = []
+    for experiment in range(num_experiments):
+        for replication in range(num_replications):
+            graph_data = {'seed': lst_seeds[replication],
+                          't_end': t_end,
+                          'd_rho': accepted_deviation_occupancy,
+                          'd_delta_relative': accepted_deviation_delta_relative}
+            graph_data.update({key: value[experiment] for key, value in input_data_dict.items()})
+            jobs.append({'experiment': experiment, 'replication': replication, 'graph_data': graph_data})
+
+    ## Run experiments
+    results = run_parallel(jobs, model_path_abs, stop_condition, num_workers=num_workers,
+                           bool_local_planner=bool_local_planner)
+
+    ## Collect results in order of experiment and replication
+    df_settings = pd.DataFrame([{'experiment': result['job']['experiment'],
+                                 'replication': result['job']['replication'],
+                                 'iat': result['job']['graph_data']['iat'],
+                                 'server_time': result['job']['graph_data']['server_time']}
+                                for result in results], columns=settings_columns)
+    df_outputs = pd.DataFrame([{k: v for k, v in result['data'].items() if k in outputs_for_analysis}
+                               for result in results], columns=outputs_for_analysis)
+
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+
+    ## Analysis of multiple runs
+    df_results, verdict = analyse_results(df_settings, df_outputs, min_perc_within_bandwidth_occupancy,
+                                          min_perc_within_bandwidth_delta_relative)
+
+    df_results.to_csv('results.csv')
+
+    ## Get execution time
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+    print(f"Execution time: {elapsed_time:.2f}")
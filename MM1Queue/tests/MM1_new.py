@@ -1,27 +1,449 @@
 import salabim as sim
+import numpy as np
 import random
 import time
 
 ## Salabim simulation model
 class ClientGenerator(sim.Component):
+    def setup(self, model):
+        self.model = model
+
     def process(self):
         while True:
-            Client()
-            yield self.hold(inter_arrival_time_dis.sample())
+            Client(model=self.model, env=self.env)
+            yield self.hold(self.model.inter_arrival_time_dis.sample())
 
 class Client(sim.Component):
+    def setup(self, model):
+        self.model = model
+
     def process(self):
-        yield self.request(clerks)
-        yield self.hold(service_duration_dis.sample())
-        yield self.release(clerks)
-
-env = sim.Environment(trace=False)
-number_of_clerks = 1
-iat = 1
-server_time = 0.9
-inter_arrival_time_dis = sim.Exponential(iat)
-service_duration_dis = sim.Exponential(server_time)
-clerks = sim.Resource(name="clerks", capacity=number_of_clerks)
+        model = self.model
+        if model.observed:
+            model.arrival(self)
+        yield self.request(model.clerks)
+        yield self.hold(model.service_duration_dis.sample())
+        if model.observed:
+            model.departure(self) # At the time of the release
+        yield self.release(model.clerks)
+
+## Online statistics, with constant memory
+class Tally:
+    """Mean and variance of observations, updated with Welford's algorithm. The variance is that of the population,
+    as for monitors of Salabim"""
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def mean(self):
+        return self._mean if self.count else float('nan')
+
+    def variance(self):
+        return self._m2 / self.count if self.count else float('nan')
+
+class TimeAverage:
+    """Time-weighted mean and variance of a level that changes at events, as a level monitor of Salabim"""
+    def __init__(self, value=0, time=0):
+        self.value = value
+        self._time = time
+        self._start = time
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def set(self, value, time):
+        """Change the level at 'time'"""
+        self._add_segment(self.value, time - self._time)
+        self.value = value
+        self._time = time
+
+    def _add_segment(self, value, duration):
+        # Weighted version of Welford's algorithm (West, 1979)
+        total = self._time - self._start + duration
+        if duration > 0:
+            delta = value - self._mean
+            self._mean += delta * duration / total
+            self._m2 += duration * delta * (value - self._mean)
+
+    def mean(self, now):
+        """:return: (float) time-weighted mean from the start until 'now'"""
+        if now <= self._start:
+            return float('nan') # No time has passed, as for an empty monitor of Salabim
+        duration = now - self._time
+        delta = self.value - self._mean
+        return self._mean + delta * duration / (now - self._start)
+
+    def variance(self, now):
+        """:return: (float) time-weighted variance from the start until 'now'"""
+        if now <= self._start:
+            return float('nan')
+        duration = now - self._time
+        delta = self.value - self._mean
+        mean = self._mean + delta * duration / (now - self._start)
+        return (self._m2 + duration * delta * (self.value - mean)) / (now - self._start)
+
+class WarmUp:
+    """
+    Warm-up detection with MSER-5 (White, 1997), in constant memory. Simulated time is split into windows of equal
+    length. Per window, the time integral of each level (e.g. the queue length) and the sum and count of each tally
+    (e.g. waiting times) are kept. When there are max_windows windows, adjacent windows are merged and their length
+    doubles. MSER-5 takes batch means of 5 windows of a level, and truncates the batches before the one that
+    minimizes the squared error of the mean of the rest, divided by the number of batches left, squared.
+    """
+    def __init__(self, levels, tallies, window=1.0, max_windows=1000):
+        """
+        :param levels: (list) names of levels, which start at 0 at time 0
+        :param tallies: (list) names of tallies
+        :param window: (float) initial length of a window in simulated time
+        :param max_windows: (int) maximum number of windows, even
+        """
+        self.window = window
+        self.max_windows = max_windows
+        self.values = {name: 0 for name in levels} # Current value of each level
+        self._times = {name: 0 for name in levels} # Time up to which each level is integrated
+        self.integrals = {name: [] for name in levels}
+        self.sums = {name: [] for name in tallies}
+        self.counts = {name: [] for name in tallies}
+
+    def _window_index(self, time):
+        """:return: (int) index of the window that 'time' is in, after merging windows if needed"""
+        while int(time / self.window) >= self.max_windows:
+            self._merge()
+        return int(time / self.window)
+
+    def _merge(self):
+        for lists in (self.integrals, self.sums, self.counts):
+            for name, values in lists.items():
+                lists[name] = [sum(values[index:index + 2]) for index in range(0, len(values), 2)]
+        self.window *= 2
+
+    @staticmethod
+    def _add(values, index, value):
+        if len(values) <= index:
+            values.extend([0] * (index + 1 - len(values)))
+        values[index] += value
+
+    def set(self, name, value, time):
+        """Change level 'name' to 'value' at 'time'"""
+        start = self._times[name]
+        while start < time:
+            index = self._window_index(start)
+            end = min(time, (index + 1) * self.window)
+            if end <= start: # 'start' is on the boundary of a window, up to rounding
+                index += 1
+                end = min(time, (index + 1) * self.window)
+            self._add(self.integrals[name], index, self.values[name] * (end - start))
+            start = end
+        self.values[name] = value
+        self._times[name] = time
+
+    def add(self, name, value, time):
+        """Add an observation of tally 'name', made at 'time'"""
+        index = self._window_index(time)
+        self._add(self.sums[name], index, value)
+        self._add(self.counts[name], index, 1)
+
+    def truncation_time(self, now, levels=None):
+        """
+        :param now: (float) current simulated time; the window that 'now' is in is not complete, and not used
+        :param levels: (list) names of the levels to use, or None for all; the latest of their truncations is taken
+        :return: (float) end of the warm-up period, at the start of a batch; 0 if there are too few batches
+        """
+        num_batches = min(int(now / self.window), len(self.integrals[next(iter(self.integrals))])) // 5
+        truncation = 0
+        for name in levels or self.integrals:
+            integrals = self.integrals[name] + [0] * (5 * num_batches - len(self.integrals[name]))
+            means = [sum(integrals[5 * batch:5 * batch + 5]) / (5 * self.window) for batch in range(num_batches)]
+            truncation = max(truncation, _mser(means))
+        return truncation * 5 * self.window
+
+    def level_mean(self, name, start, now):
+        """:return: (float) time-weighted mean of level 'name' from 'start' (the start of a window) until 'now'"""
+        if now <= start:
+            return float('nan')
+        integral = sum(self.integrals[name][int(round(start / self.window)):])
+        integral += self.values[name] * (now - self._times[name]) # Not integrated yet
+        return integral / (now - start)
+
+    def tally_mean(self, name, start):
+        """:return: (float) mean of the observations of tally 'name' from 'start' (the start of a window)"""
+        first = int(round(start / self.window))
+        count = sum(self.counts[name][first:])
+        return sum(self.sums[name][first:]) / count if count else float('nan')
+
+    def batch_means(self, start, now, num_batches=20):
+        """
+        Means of all levels and tallies in batches of complete windows, from 'start' (the start of a window) on.
+        :return: (dict) name: list of num_batches means (NaN for a tally without observations); None if there are
+            less complete windows than batches
+        """
+        first = int(round(start / self.window))
+        size = (int(now / self.window) - first) // num_batches # Windows per batch
+        if size < 1:
+            return None
+        batches = {}
+        for name, integrals in self.integrals.items():
+            integrals = integrals + [0] * (first + num_batches * size - len(integrals))
+            batches[name] = [sum(integrals[first + batch * size:first + (batch + 1) * size]) / (size * self.window)
+                             for batch in range(num_batches)]
+        for name in self.sums:
+            batches[name] = []
+            for batch in range(num_batches):
+                count = sum(self.counts[name][first + batch * size:first + (batch + 1) * size])
+                total = sum(self.sums[name][first + batch * size:first + (batch + 1) * size])
+                batches[name].append(total / count if count else float('nan'))
+        return batches
+
+def _mser(means):
+    """:return: (int) number of values to truncate from the start of 'means', by the MSER rule"""
+    if len(means) < 4:
+        return 0
+    best, best_statistic = 0, float('inf')
+    suffix_sum = suffix_squares = 0.0
+    statistics = []
+    for mean in reversed(means):
+        suffix_sum += mean
+        suffix_squares += mean * mean
+        statistics.append((suffix_sum, suffix_squares))
+    statistics.reverse()
+    for truncation in range(len(means) // 2 + 1): # At most half of the run is truncated
+        left = len(means) - truncation
+        suffix_sum, suffix_squares = statistics[truncation]
+        statistic = max(suffix_squares - suffix_sum * suffix_sum / left, 0) / left ** 2
+        if statistic < best_statistic:
+            best, best_statistic = truncation, statistic
+    return best
+
+def control_variate_estimate(estimate, observations, controls, control_observations, control_means):
+    """
+    Control-variate estimate of a mean (Lavenberg and Welch, 1981): estimate - beta * (controls - control_means).
+    The coefficients beta are fitted with least squares on observations, e.g. batch means of a run.
+    :param estimate: (float) sample mean of the run
+    :param observations: (list) observations of the same quantity, e.g. its batch means
+    :param controls: (list) sample mean of each control in the run, e.g. of the service times that were drawn
+    :param control_observations: (list) for each control, its observations, paired with 'observations'
+    :param control_means: (list) known mean of each control
+    :return: (float) estimate with less variance, or 'estimate' if there are too few complete observations
+    """
+    y = np.asarray(observations, dtype=float)
+    x = np.asarray(control_observations, dtype=float).T
+    complete = ~np.isnan(y) & ~np.isnan(x).any(axis=1)
+    y, x = y[complete], x[complete]
+    if len(y) <= x.shape[1] + 1: # Intercept and a coefficient per control
+        return estimate
+    x_centered = x - x.mean(axis=0)
+    beta = np.linalg.lstsq(x_centered, y - y.mean(), rcond=None)[0]
+    return float(estimate - beta @ (np.asarray(controls, dtype=float) - np.asarray(control_means, dtype=float)))
+
+## Random streams
+class AntitheticRandom(random.Random):
+    """Random stream that returns 1 - u instead of each uniform number u, for the antithetic run of a pair"""
+    def random(self):
+        u = super().random()
+        return 1.0 - u if u > 0 else u # 1 - u < 1, as random(); u = 0 is kept, so that log(1 - u) is defined
+
+class MM1Model:
+    """
+    M/M/1 queue with its own Salabim environment, random streams, resource and distributions.
+    Models do not share state, so several can be simulated side by side in one process:
+
+        model = MM1Model(iat=1.0, server_time=0.5, seed=7)
+        model.env.run(till=1000)
+        outputs = model.outputs() # L, L_q, W, W_q and occupancy
+
+    With streaming=True the monitors of the resource keep no history: the statistics are kept in Tally and
+    TimeAverage objects instead, so memory does not grow with the simulated time. make_outputs and the 'tx()' data
+    of the monitors are then not available.
+    With warm_up=True the statistics are also kept per window of time, so that outputs(truncate=True) can leave out
+    the transient from the empty system at the start (see WarmUp).
+    With control_variates=True the windows also keep the inter-arrival and service times that were drawn, whose
+    means are known (iat and server_time), so that outputs(control_variates=True) can correct the outputs for them.
+
+    Inter-arrival times and service times have a random stream each, seeded from 'seed'. Models with the same seed
+    therefore give the n-th client the same uniform random numbers, whatever iat and server_time are: common random
+    numbers across experiments. With antithetic=True, every uniform number u is replaced by 1 - u.
+    """
+    def __init__(self, iat=1, server_time=0.9, seed=None, number_of_clerks=1, streaming=False, warm_up=False,
+                 antithetic=False, control_variates=False):
+        """
+        :param iat: (float) mean inter-arrival time
+        :param server_time: (float) mean service time
+        :param seed: seed of the random streams of this model; None for 1234567, as Salabim's random_seed
+        :param streaming: (bool) keep statistics with constant memory, instead of in monitors of Salabim
+        :param warm_up: (bool) keep statistics per window of time, for warm-up truncation
+        :param antithetic: (bool) antithetic run: of a pair of runs with the same seed, the second one
+        :param control_variates: (bool) keep statistics per window of time, for control-variate estimates
+        """
+        self.env = sim.Environment(trace=False, random_seed='') # '': the global random stream is not seeded
+        seeds = random.Random(1234567 if seed is None else seed)
+        stream_class = AntitheticRandom if antithetic else random.Random
+        self.arrival_random = stream_class(seeds.getrandbits(64))
+        self.service_random = stream_class(seeds.getrandbits(64))
+        self.iat = iat
+        self.server_time = server_time
+        self.inter_arrival_time_dis = sim.Exponential(iat, randomstream=self.arrival_random, env=self.env)
+        self.service_duration_dis = sim.Exponential(server_time, randomstream=self.service_random, env=self.env)
+        self.seed = seed
+        self.antithetic = antithetic
+        self.number_of_clerks = number_of_clerks
+        self.streaming = streaming
+        self.warm_up = warm_up
+        self.control_variates = control_variates
+        self.observed = streaming or warm_up or control_variates # Clients call the hooks under 'Statistics'
+        self.clerks = sim.Resource(name="clerks", capacity=number_of_clerks, monitor=not streaming, env=self.env)
+        if self.observed:
+            self.queue_length = TimeAverage() # Number of clients in 'requesters'
+            self.number_in_service = TimeAverage() # Number of clients in 'claimers'
+            self.waiting_time = Tally() # Length of stay in 'requesters', also when zero
+            self.service_time = Tally() # Length of stay in 'claimers'
+            self.last_arrival_time = None
+        self.windows = WarmUp(['queue_length', 'number_in_service'],
+                              ['waiting_time', 'service_time', 'inter_arrival_time'],
+                              window=iat) if warm_up or control_variates else None
+        self.generator = ClientGenerator(model=self, env=self.env)
+        if streaming:
+            self.generator.status.monitor(False) # The generator lives as long as the run: no history of its status
+        self.num_events = 0 # Number of calls of step()
+        self._time_of_step = self.env.now()
+
+    def step(self):
+        """Advance to the next event"""
+        self.env.step()
+        self.num_events += 1
+        self._time_of_step = self.env.now()
+
+    def advance_until_change(self, state, t_end=None, check=None):
+        """
+        Advance event by event, until the value of 'state' changes or the time passes t_end: a macro-step, instead
+        of a return to the caller after every event.
+        :param state: function without arguments, e.g. that returns the values of the guards of a test model
+        :param t_end: (float) simulated time after which to stop, or None
+        :param check: function without arguments that is called after every event, e.g. with asserts; or None
+        :return: (int) number of events
+        """
+        start_state = state()
+        num_events = 0
+        while True:
+            self.step()
+            num_events += 1
+            if check:
+                check()
+            if (t_end is not None and self.env.now() > t_end) or state() != start_state:
+                return num_events
+
+    ## Statistics
+    def arrival(self, client):
+        client.arrival_time = self.env.now()
+        self.queue_length.set(self.queue_length.value + 1, client.arrival_time)
+        if self.windows:
+            self.windows.set('queue_length', self.queue_length.value, client.arrival_time)
+            if self.last_arrival_time is not None:
+                self.windows.add('inter_arrival_time', client.arrival_time - self.last_arrival_time,
+                                 client.arrival_time)
+        self.last_arrival_time = client.arrival_time
+        if self.number_in_service.value < self.number_of_clerks: # The request is honored at once
+            self.service_start(client)
+
+    def service_start(self, client):
+        client.service_start_time = now = self.env.now()
+        self.queue_length.set(self.queue_length.value - 1, now)
+        self.number_in_service.set(self.number_in_service.value + 1, now)
+        self.waiting_time.add(now - client.arrival_time)
+        if self.windows:
+            self.windows.set('queue_length', self.queue_length.value, now)
+            self.windows.set('number_in_service', self.number_in_service.value, now)
+            self.windows.add('waiting_time', now - client.arrival_time, now)
+
+    def departure(self, client):
+        now = self.env.now()
+        self.number_in_service.set(self.number_in_service.value - 1, now)
+        self.service_time.add(now - client.service_start_time)
+        if self.windows:
+            self.windows.set('number_in_service', self.number_in_service.value, now)
+            self.windows.add('service_time', now - client.service_start_time, now)
+        # The release honors the first requester now, but its process only continues at the next event
+        head = self.clerks.requesters().head()
+        if head is not None:
+            self.service_start(head)
+
+    def outputs(self, truncate=False, control_variates=False):
+        """
+        Mean values, as make_outputs, without the data over time.
+        :param truncate: (bool) only after the warm-up period, found by MSER-5 on the number in service (the
+            occupancy); needs warm_up=True. The queue length is more noisy, and its truncation leaves more bias
+        :param control_variates: (bool) corrected with the mean inter-arrival and service times that were drawn, as
+            control variates, with coefficients fitted on batch means of the run; needs control_variates=True
+        :return: (dict) 'L', 'L_q', 'W', 'W_q' and 'occupancy'; and 'warm_up_time' when truncated
+        """
+        now = self.env.now()
+        if truncate or control_variates:
+            if not self.windows:
+                raise ValueError("Truncated outputs and control variates need an MM1Model with warm_up=True or "
+                                 "control_variates=True.")
+            start = self.windows.truncation_time(now, ['number_in_service']) if truncate else 0
+            L_q = self.windows.level_mean('queue_length', start, now)
+            L_s = self.windows.level_mean('number_in_service', start, now)
+            W_q = self.windows.tally_mean('waiting_time', start)
+            W_s = self.windows.tally_mean('service_time', start)
+            outputs = {'L': L_q + L_s, 'L_q': L_q, 'W': W_q + W_s, 'W_q': W_q, 'occupancy': L_s / self.number_of_clerks}
+            if control_variates:
+                outputs = self._control_variate_outputs(outputs, start, now)
+            if truncate:
+                outputs['warm_up_time'] = start
+            return outputs
+        if self.streaming:
+            L_q = self.queue_length.mean(now)
+            L_s = self.number_in_service.mean(now)
+            W_q = self.waiting_time.mean()
+            W_s = self.service_time.mean()
+            occupancy = L_s / self.number_of_clerks
+        else:
+            L_q = self.clerks.requesters().length.mean()
+            L_s = self.clerks.claimers().length.mean()
+            W_q = self.clerks.requesters().length_of_stay.mean()
+            W_s = self.clerks.claimers().length_of_stay.mean()
+            occupancy = self.clerks.occupancy.mean()
+        return {'L': L_q + L_s, 'L_q': L_q, 'W': W_q + W_s, 'W_q': W_q, 'occupancy': occupancy}
+
+    def _control_variate_outputs(self, outputs, start, now):
+        """:return: (dict) outputs, corrected with the inter-arrival and service times as control variates"""
+        batches = self.windows.batch_means(start, now)
+        if batches is None: # Run too short for batches
+            return outputs
+        batches['L_q'] = batches['queue_length']
+        batches['L'] = list(np.add(batches['queue_length'], batches['number_in_service']))
+        batches['W_q'] = batches['waiting_time']
+        batches['W'] = list(np.add(batches['waiting_time'], batches['service_time']))
+        batches['occupancy'] = list(np.divide(batches['number_in_service'], self.number_of_clerks))
+        controls = [self.windows.tally_mean('inter_arrival_time', start),
+                    self.windows.tally_mean('service_time', start)]
+        control_observations = [batches['inter_arrival_time'], batches['service_time']]
+        return {key: control_variate_estimate(value, batches[key], controls, control_observations,
+                                              [self.iat, self.server_time])
+                for key, value in outputs.items()}
+
+    ## Pickling, e.g. for checkpoints. Salabim's processes are generators, which can not be pickled: the model is
+    ## built again with the same seed, and its events are replayed
+    def __getstate__(self):
+        if self.env.now() != self._time_of_step:
+            raise TypeError("MM1Model can only be pickled when it was advanced with step().")
+        return {'iat': self.iat, 'server_time': self.server_time, 'seed': self.seed,
+                'number_of_clerks': self.number_of_clerks, 'streaming': self.streaming, 'warm_up': self.warm_up,
+                'antithetic': self.antithetic, 'control_variates': self.control_variates,
+                'num_events': self.num_events}
+
+    def __setstate__(self, state):
+        self.__init__(state['iat'], state['server_time'], state['seed'], state['number_of_clerks'],
+                      state.get('streaming', False), state.get('warm_up', False), state.get('antithetic', False),
+                      state.get('control_variates', False))
+        for event in range(state['num_events']):
+            self.step()
 
 ## Rename Salabim's statistics outputs for later comparison to analytical solutions
 def make_outputs(clerks):
@@ -44,13 +466,12 @@ def make_outputs(clerks):
 ## Do a simulation run with fixed settings directly from this script
 if __name__ == "__main__":
     # Run model
-    ClientGenerator()
+    random.seed(time.time())
+    model = MM1Model(iat=1, server_time=0.9, seed=random.randint(1,123456))
 
     end_sim_time = 10000
-    random.seed(time.time())
-    env.random_seed(random.randint(1,123456))
-    env.run(till=end_sim_time)
+    model.env.run(till=end_sim_time)
 
     # Create outputs
-    L, L_q, W, W_q, occupancy, occupancy_data = make_outputs(clerks)
+    L, L_q, W, W_q, occupancy, occupancy_data = make_outputs(model.clerks)
     print(f'Occupancy: {occupancy}')
@@ -1,11 +1,7 @@
 import unittest
 import numpy as np
-from warnings import warn
-import importlib
 from scipy import stats
-import salabim as sim
 import test
-import time
 
 import os
 import sys
@@ -16,40 +12,71 @@ sys.path.append(parent_dir)
 # import MM1_new as MM1 # Import SUT from parent folder
 from . import MM1_new as MM1
 
+## Add root of repository to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from mbt_tools.diagnostics import Diagnostics
+from mbt_tools.profiling import sut_advance
+diagnostics = Diagnostics(max_examples=5) # Counts of messages per category, summarized at the end of the run
+
 ## Setting: Test statistics in 'tearDownModel' or not. Set to False when multiple replications are to be performed
 
-def setUpRun(data):
-    # Reload SUT for new replication
-    importlib.reload(MM1)
+def tearDownRun():
+    diagnostics.emit()
 
 def advance_and_update_data(self, data):
     """
     Advance Salabim's simulation time to the next scheduled event.
+    With macro_step, advance event by event until the guards of the model change, after time zero.
     Update graph data that is used in abstract model for guards.
     Update data in memory list that are used in this test script.
     """
     # Advance SUT to next event
-    MM1.env.step()
+    with sut_advance(): # Counted as SUT time when the run is profiled
+        if self.macro_step and self.sut.env.now() > 0:
+            num_events = self.sut.advance_until_change(lambda: guard_buckets(self.sut), float(data['t_end']),
+                                                       check=lambda: check_event(self))
+        else:
+            self.sut.step()
+            num_events = 1
+            update_memories(self)
 
     # Update graph data
-    data["t"] = MM1.env.now()  # time
-    data["q"] = MM1.clerks.requesters().length()  # queue length
-    num_in_system = MM1.clerks.requesters().length() + MM1.clerks.claimers().length() # Total number of entities in system
-    data["s"] = num_in_system
+    data["t"] = self.sut.env.now()  # time
+    data["q"] = self.sut.clerks.requesters().length()  # queue length
+    data["s"] = self.mem_num_in_system[-1] # Total number of entities in system
+
+    self.num_steps += num_events # Count number of time advances in this run
 
-    # Update memories for further asserts
+def update_memories(self):
+    """Update memories for further asserts, after an event"""
+    num_in_system = self.sut.clerks.requesters().length() + self.sut.clerks.claimers().length()
     self.mem_num_in_system.append(num_in_system)
     self.mem_num_in_system = self.mem_num_in_system[-2:]  # Keep last two entries
-    self.mem_num_in_service.append(MM1.clerks.claimers().length())  # Number of entities in service
+    self.mem_num_in_service.append(self.sut.clerks.claimers().length())  # Number of entities in service
     self.mem_num_in_service = self.mem_num_in_service[-2:]  # Keep last two entries
 
-    # Deal with TCP/IP problem
-    self.num_steps += 1 # Count number of time advances across AltWalker runs
-    if self.num_steps == 1000:
-        warn("120 second pause in execution starting.")
-        time.sleep(121) # Pause execution for more than 120 seconds
-        self.num_steps = 0 # Reset num_steps counter
-    data['n_advances'] = self.num_steps
+def guard_buckets(sut):
+    """
+    Values of the guards on q and s of the model, after time zero: q==0, q==1, q>1 and s==0, s==1.
+    An event that leaves them unchanged would lead to a self-edge (e_self0, e_self1, e_self2, e_selfNone).
+    """
+    num_in_queue = sut.clerks.requesters().length()
+    return min(num_in_queue, 2), min(num_in_queue + sut.clerks.claimers().length(), 2)
+
+def check_event(self):
+    """
+    Asserts after every event of a macro-step, as the vertices only see the last event of a macro-step.
+    The number of entities in the system may only change by 1. Clients join the queue and are served in FIFO order.
+    """
+    update_memories(self)
+    self.assertLessEqual(abs(np.diff(self.mem_num_in_system)), 1)
+
+    requesters = self.sut.clerks.requesters()
+    if requesters.length() > 1: # The last one to join has not been created before the one in front of it
+        self.assertGreaterEqual(requesters.tail().creation_time(),
+                                requesters.predecessor(requesters.tail()).creation_time())
+    if requesters.length() and self.sut.clerks.claimers().length():
+        self.assertLess(self.sut.clerks.claimers().head().creation_time(), requesters.head().creation_time())
 
 class MM1_FIFO(unittest.TestCase):
     def setUpModel(self, data):
@@ -57,13 +84,20 @@ class MM1_FIFO(unittest.TestCase):
         self.seed = int(data['seed'])
         self.iat = float(data['iat'])
         self.server_time = float(data['server_time'])
-
-        ## Initialize SUT objects with new parameter values
-        importlib.reload(MM1)
-        MM1.inter_arrival_time_dis = sim.Exponential(self.iat)
-        MM1.service_duration_dis = sim.Exponential(self.server_time)
-        MM1.env.random_seed(self.seed)
-        MM1.ClientGenerator()
+        self.streaming = str(data.get('streaming', False)).lower() == 'true' # Optional; GraphWalker passes 'true'
+        self.warm_up = str(data.get('warm_up', False)).lower() == 'true' # Optional
+        self.antithetic = str(data.get('antithetic', False)).lower() == 'true' # Optional: second run of a pair
+        self.control_variates = str(data.get('control_variates', False)).lower() == 'true' # Optional
+        self.macro_step = str(data.get('macro_step', False)).lower() == 'true' # Optional: see advance_and_update_data
+
+        ## Initialize SUT with new parameter values. Each test instance has its own model, so no module is reloaded
+        # streaming: statistics in constant memory, without the history of Salabim's monitors
+        # warm_up: statistics in tearDownModel leave out the transient from the empty system at the start
+        # antithetic: 1 - u for every uniform random number u of the run with the same seed
+        # control_variates: statistics in tearDownModel are corrected with the inter-arrival and service times drawn
+        self.sut = MM1.MM1Model(iat=self.iat, server_time=self.server_time, seed=self.seed, streaming=self.streaming,
+                                warm_up=self.warm_up, antithetic=self.antithetic,
+                                control_variates=self.control_variates)
 
         # Initialize memory lists used for asserts
         self.mem_num_in_system = [] # Number of entities in 'system'
@@ -74,11 +108,11 @@ class MM1_FIFO(unittest.TestCase):
             rho = self.server_time / self.iat
             msg = f"setUpModel. Given the input parameters, 'rho' is too high: rho = {rho:.2f} >= 1. The system is therefore likely not stable. \n"
               #    f"Inter-arrival time = {self.iat:.2f}, server time = {self.server_time:.2f}"
-            warn(msg)
+            diagnostics.note('setUpModel', msg)
 
 
-        # Debugging: count AltWalker steps
-        self.num_steps = int(data['n_advances']) # Take from previous test run
+        # Debugging: count time advances of SUT
+        self.num_steps = 0
 
     def tearDownModel(self, data):
         """
@@ -96,29 +130,28 @@ class MM1_FIFO(unittest.TestCase):
         W_system_an = 1 / (mu - lambd) if mu != lambd else float('inf')
         W_queue_an =  rho / (mu - lambd) if mu != lambd else float('inf')
 
-        # Data points, mean values, and analytical solution for level monitors
+        # Mean values, and analytical solution. Only mean values are read, so no monitor data is copied
+        # With warm_up, the means are taken after the warm-up period that MSER-5 found
+        # With control_variates, the means are corrected for the deviation of the samples from iat and server_time
+        outputs = self.sut.outputs(truncate=self.warm_up, control_variates=self.control_variates)
         L_system = {
             "name": "L: Number of items in system",
-            "data": MM1.clerks.requesters().length.tx()[1] + MM1.clerks.claimers().length.tx()[1],
-            "mean": MM1.clerks.requesters().length.mean() + MM1.clerks.claimers().length.mean(), # Time-average number
+            "mean": outputs['L'], # Time-average number
             "mean analytical": L_system_an
         }
         L_queue = {
             "name": "L_q: Number of items in queue (requesters)",
-            "data": MM1.clerks.requesters().length.tx()[1],
-            "mean": MM1.clerks.requesters().length.mean(), # Time-average
+            "mean": outputs['L_q'], # Time-average
             "mean analytical": L_queue_an,
         }
         W_system = { # Time in system
             "name": "W: Time in system",
-            "data": MM1.clerks.requesters().length_of_stay.tx()[1] + MM1.clerks.claimers().length_of_stay.tx()[1],
-            "mean": MM1.clerks.requesters().length_of_stay.mean() + MM1.clerks.claimers().length_of_stay.mean(),
+            "mean": outputs['W'],
             "mean analytical": W_system_an,
         }
         W_queue = {
             "name": "W_q: Time in queue (requesters)",
-            "data": MM1.clerks.requesters().length_of_stay.tx()[1],
-            "mean": MM1.clerks.requesters().length_of_stay.mean(),
+            "mean": outputs['W_q'],
             "mean analytical": W_queue_an,
         }
 
@@ -135,21 +168,23 @@ class MM1_FIFO(unittest.TestCase):
         delta_relative_verdict = 'passed'
         if rho < 1 and delta_relative > accepted_deviation_delta_relative:
             msg = f"tearDownModel. Deviation from Little's law is too high: (W - L / lambda) = {delta:.2f}, or {delta_relative:.2f} % of W. Max. deviation is {accepted_deviation_delta_relative}. \n" f"W = {W_system['mean']:.2f}, L = {L_system['mean']:.2f}, lambda = {lambd:.2f}."
-            warn(msg)
+            diagnostics.note('tearDownModel.little', msg)
             delta_relative_verdict = 'failed'
 
         ## Occupancy compared to analytical solution
-        occupancy_mean = MM1.clerks.occupancy.mean()
+        occupancy_mean = outputs['occupancy']
         occupancy_deviation_relative = abs((rho - occupancy_mean) / rho) * 100
         occupancy_verdict = 'passed'
         if rho < 1 and occupancy_deviation_relative > accepted_deviation_occupancy:
             msg = f"tearDownModel. Difference between mean occupancy and analytical solution is too high: (|rho - occupancy| / rho) = {occupancy_deviation_relative:.4f} % > {accepted_deviation_occupancy} %. \n" \
                   f"Occupancy = {occupancy_mean:.4f}, analytical   solution for rho = {rho:.4f}"
-            warn(msg)
+            diagnostics.note('tearDownModel.occupancy', msg)
             occupancy_verdict = 'failed'
 
-        msg = f"End of run. t = {MM1.env.now():.2f}. Result: occupancy = {occupancy_mean:.4f}. \n Number of time advances done: {self.num_steps}"
-        warn(msg)
+        msg = f"End of run. t = {self.sut.env.now():.2f}. Result: occupancy = {occupancy_mean:.4f}. \n Number of time advances done: {self.num_steps}"
+        if self.warm_up:
+            msg += f". Warm-up period left out: t < {outputs['warm_up_time']:.2f}"
+        diagnostics.note('tearDownModel.end', msg)
 
         ## Send results of runs to test execution script
         data['occupancy_mean'] = occupancy_mean
@@ -158,7 +193,8 @@ class MM1_FIFO(unittest.TestCase):
         data['delta'] = delta
         data['delta_relative'] = delta_relative
         data['delta_relative_verdict'] = delta_relative_verdict
-        data['t_end_exact'] = MM1.env.now() # Exact t_end will differ from input parameter t_end
+        data['t_end_exact'] = self.sut.env.now() # Exact t_end will differ from input parameter t_end
+        data['t_warm_up'] = outputs.get('warm_up_time', 0) # Start of the period of the statistics
 
 
     def v_NoStepYet(self):
@@ -167,11 +203,11 @@ class MM1_FIFO(unittest.TestCase):
         Assumption: all Client instances created by ClientGenerator succeed to enter requesters.
         """
         # Check if time is actually zero
-        self.assertEqual(MM1.env.now(), 0)
+        self.assertEqual(self.sut.env.now(), 0)
 
         # Number of entities in queues
-        self.assertEqual(MM1.clerks.requesters().length(), 0)
-        self.assertEqual(MM1.clerks.claimers().length(), 0)
+        self.assertEqual(self.sut.clerks.requesters().length(), 0)
+        self.assertEqual(self.sut.clerks.claimers().length(), 0)
 
     def e_AdvanceFirst(self, data):
         """
@@ -189,10 +225,10 @@ class MM1_FIFO(unittest.TestCase):
         Assumption: all Client instances created by ClientGenerator succeed to enter 'system'.
         """
         # Update queue length in graph data
-        data["q"] = MM1.clerks.requesters().length()
+        data["q"] = self.sut.clerks.requesters().length()
 
         # Update memories for further asserts
-        self.mem_num_in_system.append(MM1.clerks.requesters().length() + MM1.clerks.claimers().length())
+        self.mem_num_in_system.append(self.sut.clerks.requesters().length() + self.sut.clerks.claimers().length())
         self.mem_num_in_system = self.mem_num_in_system[-2:] # Keep last 2 entries
 
         # Asserts for when second time advance has been executed:
@@ -200,8 +236,8 @@ class MM1_FIFO(unittest.TestCase):
             # First entity should be in the MM1.system
             self.assertEqual(self.mem_num_in_system[-1], 1)
             # First entity should claim Resource immediately
-            self.assertEqual(MM1.clerks.claimers().length(), 1)
-            self.assertEqual(MM1.clerks.requesters().length(), 0)
+            self.assertEqual(self.sut.clerks.claimers().length(), 1)
+            self.assertEqual(self.sut.clerks.requesters().length(), 0)
 
         # Advance time and update data
         advance_and_update_data(self, data)
@@ -226,17 +262,16 @@ class MM1_FIFO(unittest.TestCase):
         DO NOT advance time in SUT.
         Guards: q==1 (one in queue); t>0
         """
-        msg = f"One new entity joins queue, at first event with time t > 0 \n " \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
-        warn(msg)
+        diagnostics.note('e_OneInQueue', lambda: f"One new entity joins queue, at first event with time t > 0 \n "
+                                                 f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
     def e_MultipleInQueue(self, data):
         """
         DO NOT advance time in SUT.
         Guards: q>1 (multiple in queue); t>0
         """
-        msg = f"Multiple new entities join queue, at first event with time > 0 \n" \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
+        diagnostics.note('e_MultipleInQueue', lambda: f"Multiple new entities join queue, at first event with time > 0 \n"
+                                                      f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
     def v_NoneInQueue(self, data):
         """
@@ -246,7 +281,7 @@ class MM1_FIFO(unittest.TestCase):
         If there is an entity in the system, it should be in service.
         """
         # Double check if guard has worked correctly
-        self.assertEqual(MM1.clerks.requesters().length(), 0) # Queue is empty
+        self.assertEqual(self.sut.clerks.requesters().length(), 0) # Queue is empty
         self.assertEqual(int(data["q"]), 0) # Queue is empty according to graph data
 
         # Get change in number of entities in system
@@ -269,9 +304,9 @@ class MM1_FIFO(unittest.TestCase):
         If an entity is in service, its time of creation should be lower than that of the entity in the queue.
         """
         # Double check if guard has worked correctly
-        self.assertEqual(MM1.clerks.requesters().length(), 1) # Queue contains one entity
+        self.assertEqual(self.sut.clerks.requesters().length(), 1) # Queue contains one entity
         self.assertEqual(int(data["q"]), 1) # Queue contains one entity according to graph data
-        self.assertEqual(MM1.clerks.claimers().length(), 1)
+        self.assertEqual(self.sut.clerks.claimers().length(), 1)
 
         # Get change in number of entities in system
         delta_num_in_system = np.diff(self.mem_num_in_system)
@@ -283,13 +318,13 @@ class MM1_FIFO(unittest.TestCase):
         # If there was no entity in service in previous step
         if self.mem_num_in_service[-2] == 0:
             # Then one entity should be in service now
-            self.assertEqual(MM1.clerks.claimers().length(), 1)
+            self.assertEqual(self.sut.clerks.claimers().length(), 1)
 
         # If there is an entity in service
-        if MM1.clerks.claimers().length() == 1:
+        if self.sut.clerks.claimers().length() == 1:
             # Timestamp of entity in service should be lower than that of entity in queue
-            ts_in_service = MM1.clerks.claimers().head().creation_time()
-            ts_in_queue = MM1.clerks.requesters().head().creation_time()
+            ts_in_service = self.sut.clerks.claimers().head().creation_time()
+            ts_in_queue = self.sut.clerks.requesters().head().creation_time()
             self.assertLess(ts_in_service, ts_in_queue)
 
         # Advance time and update data
@@ -305,7 +340,7 @@ class MM1_FIFO(unittest.TestCase):
         The queue must be in FIFO order.
         """
         # Double check if guard has worked correctly
-        self.assertGreater(MM1.clerks.requesters().length(), 1) # Queue contains multiple entities
+        self.assertGreater(self.sut.clerks.requesters().length(), 1) # Queue contains multiple entities
         self.assertGreater(int(data["q"]), 1 ) # Queue contains multiple entities according to graph data
 
         # Get change in number of entities in system
@@ -318,17 +353,17 @@ class MM1_FIFO(unittest.TestCase):
         # If there was no entity in service in previous step
         if self.mem_num_in_service[-2] == 0:
             # Then one entity should be in service now
-            self.assertEqual(MM1.clerks.claimers().length(), 1)
+            self.assertEqual(self.sut.clerks.claimers().length(), 1)
 
             # If there is an entity in service
-            if MM1.clerks.claimers().length() == 1:
+            if self.sut.clerks.claimers().length() == 1:
                 # Timestamp of entity in service should be lower than that of entity in queue
-                ts_in_service = MM1.clerks.claimers().head().creation_time()
-                ts_in_queue = MM1.clerks.requesters().head().creation_time()
+                ts_in_service = self.sut.clerks.claimers().head().creation_time()
+                ts_in_queue = self.sut.clerks.requesters().head().creation_time()
                 self.assertLess(ts_in_service, ts_in_queue)
 
         # Creation time of requesters in queue should follow FIFO logic
-        requester_creation_times = [entity.creation_time() for entity in MM1.clerks.requesters()]
+        requester_creation_times = [entity.creation_time() for entity in self.sut.clerks.requesters()]
         delta_creation_times = np.diff(requester_creation_times) # Differences between creation times
         # FIFO: See if all differences in creation times are positive
         self.assertTrue(all(x>=0 for x in delta_creation_times))
@@ -390,16 +425,14 @@ class MM1_FIFO(unittest.TestCase):
         v_NoneInQueue --> v_MultipleInQueue
         Guard: q>1
         """
-        msg = f"e_MultipleJoinQueue. Queue length has increased from 0 to {MM1.clerks.requesters().length()} after a single event."
-        warn(msg)
+        diagnostics.note('e_MultipleJoinQueue', lambda: f"e_MultipleJoinQueue. Queue length has increased from 0 to {self.sut.clerks.requesters().length()} after a single event.")
 
     def e_AllLeaveQueue(self):
         """"
         v_MultipleInQueue --> v_NoneInQueue
         Guard: q==0
         """
-        msg = f"e_AllLeaveQueue. Queue length() has decreased to 0 after a single event. There were {self.mem_num_in_system[-2]} entities in the system after the previous event."
-        warn(msg)
+        diagnostics.note('e_AllLeaveQueue', lambda: f"e_AllLeaveQueue. Queue length() has decreased to 0 after a single event. There were {self.mem_num_in_system[-2]} entities in the system after the previous event.")
 
 class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
     ## Override methods for some tests
@@ -410,7 +443,7 @@ class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
         There may only 1 entity in the system, which should be in service.
         """
         # Double check if guard has worked correctly
-        self.assertEqual(MM1.clerks.requesters().length(), 0) # Queue is empty
+        self.assertEqual(self.sut.clerks.requesters().length(), 0) # Queue is empty
         self.assertEqual(int(data["q"]), 0) # Queue is empty according to graph data
 
         # Get change in number of entities in system
@@ -421,7 +454,7 @@ class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
         self.assertEqual(self.mem_num_in_system[-1], 1)
 
         # Entity in system must be in service
-        self.assertEqual(MM1.clerks.claimers().length(), 1, msg="Only entity in system is not in service.")
+        self.assertEqual(self.sut.clerks.claimers().length(), 1, msg="Only entity in system is not in service.")
 
         # Advance time and update data
         advance_and_update_data(self, data)
@@ -432,8 +465,8 @@ class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
         The number of entities in the system may have only changed by 1, compared to the previous step.
         """
         # Double check if guard has worked correctly
-        self.assertEqual(MM1.clerks.requesters().length(), 0)
-        self.assertEqual(MM1.clerks.claimers().length(), 0)
+        self.assertEqual(self.sut.clerks.requesters().length(), 0)
+        self.assertEqual(self.sut.clerks.claimers().length(), 0)
 
         # Get change in number of entities in system
         delta_num_in_system = np.diff(self.mem_num_in_system)
@@ -455,18 +488,16 @@ class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
         v_NoneInService --> v_OneInQueue
         Guards: q==1
         """
-        msg = f"One new entity joins queue, while system was empty." \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
-        warn(msg)
+        diagnostics.note('e_NewToQueue', lambda: f"One new entity joins queue, while system was empty."
+                                                 f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
     def e_MultipleNewToQueue(self, data):
         """
         v_NoneInService --> v_MultipleInQueue
         Guards: q>1
         """
-        msg = f"Multiple new entities join queue, while system was empty." \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
-        warn(msg)
+        diagnostics.note('e_MultipleNewToQueue', lambda: f"Multiple new entities join queue, while system was empty."
+                                                         f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
     def e_selfNone(self):
         """
@@ -495,18 +526,16 @@ class MM1_FIFO_with_s(MM1_FIFO): # Inherits all test functions from MM1_FIFO
         v_OneInQueue --> v_NoneInSystem
         Guards: s==0
         """
-        msg = f"One entity was in queue, but all entities have left the system." \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
-        warn(msg)
+        diagnostics.note('e_QueuedLeavesSystem', lambda: f"One entity was in queue, but all entities have left the system."
+                                                         f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
     def e_AllLeaveSystem(self, data):
         """
         v_MultipleInQueue --> v_NoneInSystem
         Guards: s==0
         """
-        msg = f"Multiple entities were in queue, but all entities have left the system." \
-              f"t = {MM1.env.now()}, q = {data['q']}, s = {data['s']}"
-        warn(msg)
+        diagnostics.note('e_AllLeaveSystem', lambda: f"Multiple entities were in queue, but all entities have left the system."
+                                                     f"t = {self.sut.env.now()}, q = {data['q']}, s = {data['s']}")
 
 class MM1_FIFO_with_s_and_fail(MM1_FIFO_with_s): # Inherits all test functions from MM1_FIFO_with_s
     ## New methods for new path elements
@@ -519,6 +548,6 @@ class MM1_FIFO_with_s_and_fail(MM1_FIFO_with_s): # Inherits all test functions f
         Guard: t == 0 || t > t_end
         """
         ## Analytical solution
-        occupancy_mean = MM1.clerks.occupancy.mean()
+        occupancy_mean = self.sut.outputs()['occupancy']
         pass
 
@@ -1,6 +1,7 @@
 import numpy as np
 import os
 import json
+import sys
 
 from altwalker.planner import OnlinePlanner
 from altwalker.executor import PythonExecutor, create_executor
@@ -8,6 +9,14 @@ from altwalker.reporter import FileReporter, ClickReporter
 from altwalker.walker import Walker
 from altwalker.graphwalker import GraphWalkerClient, GraphWalkerService
 
+## Add parent directory to path, for shared helpers in 'mbt_tools'
+sys.path.append(os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+from mbt_tools.graphwalker import PooledGraphWalkerClient
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.services import ManagedGraphWalkerService
+from mbt_tools.executor import create_dispatch_executor
+from mbt_tools.walker import BatchWalker
+
 """
 Run the test package on the TwoWaySwitch ABM model.
 This test execution script simply runs the test once. No replications are implemented.
@@ -22,15 +31,19 @@ stop_condition = "random(vertex_coverage(100))" # All vertices of 'process graph
 model_specification = [(model_path_abs, stop_condition)]
 
 np.random.seed()
-gw_port = 6000
-gw_client = GraphWalkerClient(host='127.0.0.1', verbose=False, port=gw_port)
-gw_service = GraphWalkerService(models=model_specification, port=gw_port)
-planner = OnlinePlanner(client=gw_client, service=gw_service)
+bool_local_planner = False # True: plan test paths in Python with LocalPlanner, without a GraphWalker service
+if bool_local_planner:
+    gw_service = None
+    planner = LocalPlanner(models=model_specification)
+else:
+    gw_service = ManagedGraphWalkerService(models=model_specification) # Leases a free port
+    gw_client = PooledGraphWalkerClient(host='127.0.0.1', verbose=False, port=gw_service.port) # Reuses one TCP/IP connection
+    planner = OnlinePlanner(client=gw_client, service=gw_service)
 
 ## Executor
 test_path = "tests"
-url = "http://localhost:5000" # Not to be confused with 'gw_port'
-executor = create_executor(path=test_path, executor_type="python", url=url)
+url = "http://localhost:5000" # Not to be confused with the port of the GraphWalker service
+executor = create_dispatch_executor(path=test_path) # Test methods are looked up once; empty ones are skipped
 
 ## Reporter
 reporter = ClickReporter()
@@ -41,8 +54,9 @@ with open('SUT_parameter_settings.json', 'w') as f:
     json.dump(params, f)
 
 # Execute AltWalker test package
-walker = Walker(planner, executor, reporter)
+walker = BatchWalker(planner, executor, reporter) # Runs of determined steps are planned at once
 walker.run() # Run test model
-gw_service.kill() # Stop Java process
+if gw_service:
+    gw_service.kill() # Stop Java process
 
 
@@ -0,0 +1,123 @@
+"""
+Check that AsyncWalker overlaps the requests for the next step with the test method of the current step.
+A model with two vertices and two edges, without guards or actions, so that every next step may be requested
+early, is walked by AltWalker's Walker (lock-step) and by AsyncWalker. The planner is a LocalPlanner behind a
+stand-in for a slow GraphWalker, that waits before it answers get_next, and every test method sleeps.
+Lock-step takes the sum of both per step, an AsyncWalker that overlaps them only the longest of both.
+The overlap is the time saved per step, as a fraction of the shortest of both. If it is below --min-overlap,
+the script exits with status 1.
+
+    python async_overlap.py
+    python async_overlap.py --steps 40 --planner-seconds 0.05 --test-seconds 0.05 --min-overlap 0.8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+
+root_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(root_directory)
+
+from altwalker.executor import PythonExecutor
+from altwalker.reporter import Reporter
+from altwalker.walker import Walker
+
+from mbt_tools.async_walker import AsyncWalker, run_walks
+from mbt_tools.planner import LocalPlanner
+
+MODEL_JSON = {
+    'name': 'Overlap',
+    'startElementId': 'v_A',
+    'vertices': [{'id': 'v_A', 'name': 'v_A'}, {'id': 'v_B', 'name': 'v_B'}],
+    'edges': [{'id': 'e_AB', 'name': 'e_AB', 'sourceVertexId': 'v_A', 'targetVertexId': 'v_B'},
+              {'id': 'e_BA', 'name': 'e_BA', 'sourceVertexId': 'v_B', 'targetVertexId': 'v_A'}],
+}
+
+
+class SlowPlanner:
+    """
+    Planner with the requests of AltWalker's OnlinePlanner, that waits 'seconds' before it answers get_next.
+    It has no attribute 'model', so that AsyncWalker sends its requests from a thread, as to GraphWalker.
+    """
+    def __init__(self, models_json, seconds, seed=1):
+        self._planner = LocalPlanner(seed=seed)
+        self._planner.load(models_json)
+        self.seconds = seconds
+
+    def get_next(self):
+        time.sleep(self.seconds)
+        return self._planner.get_next()
+
+    def has_next(self):
+        return self._planner.has_next()
+
+    def get_data(self):
+        return self._planner.get_data()
+
+    def set_data(self, key, value):
+        self._planner.set_data(key, value)
+
+    def restart(self):
+        self._planner.restart()
+
+    def fail(self, message):
+        self._planner.fail(message)
+
+    def get_statistics(self):
+        return self._planner.get_statistics()
+
+
+def sleeping_test_module(seconds):
+    """:return: module with a test class whose methods sleep 'seconds'"""
+    module = types.ModuleType('sleeping_tests')
+    names = [element['name'] for element in MODEL_JSON['vertices'] + MODEL_JSON['edges']]
+    methods = {name: (lambda self: time.sleep(seconds)) for name in names}
+    setattr(module, MODEL_JSON['name'], type(MODEL_JSON['name'], (), methods))
+    return module
+
+
+def run_walker(walker_class, num_steps, planner_seconds, test_seconds):
+    """:return: (float) seconds per step"""
+    models_json = {'models': [dict(MODEL_JSON, generator=f"random(length({num_steps}))")]}
+    planner = SlowPlanner(models_json, planner_seconds)
+    executor = PythonExecutor(sleeping_test_module(test_seconds))
+    start = time.perf_counter()
+    if walker_class is AsyncWalker:
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, 'overlap.json')
+            with open(model_path, 'w') as f:
+                json.dump({'models': [MODEL_JSON]}, f)
+            walker = AsyncWalker(planner, executor, Reporter(), models=[(model_path, 'random(never)')])
+            status, = run_walks([walker])
+    else:
+        status = Walker(planner, executor, Reporter()).run()
+    seconds = time.perf_counter() - start
+    if not status:
+        raise RuntimeError(f"walk with {walker_class.__name__} failed")
+    return seconds / planner.get_statistics()['steps']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Overlap of requests and test methods in AsyncWalker")
+    parser.add_argument('--steps', type=int, default=20, help="length of the walk")
+    parser.add_argument('--planner-seconds', type=float, default=0.05, help="wait of the planner per step")
+    parser.add_argument('--test-seconds', type=float, default=0.05, help="duration of a test method")
+    parser.add_argument('--min-overlap', type=float, default=0.5, help="fraction below which the check fails")
+    args = parser.parse_args(argv)
+
+    lock_step = run_walker(Walker, args.steps, args.planner_seconds, args.test_seconds)
+    overlapped = run_walker(AsyncWalker, args.steps, args.planner_seconds, args.test_seconds)
+    overlap = (lock_step - overlapped) / min(args.planner_seconds, args.test_seconds)
+    print(f"{'walker':<14}{'ms/step':>10}")
+    print(f"{'Walker':<14}{lock_step * 1e3:>10.1f}")
+    print(f"{'AsyncWalker':<14}{overlapped * 1e3:>10.1f}")
+    print(f"Overlap {overlap:.0%} (minimum {args.min_overlap:.0%})")
+    if overlap < args.min_overlap:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
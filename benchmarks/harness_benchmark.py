@@ -0,0 +1,128 @@
+"""
+Benchmark of the overhead of AltWalker per step, without Java and without a SUT.
+The model is walked with test methods that do nothing, so only the walker, the executor, the planner and the
+requests to the planner are measured. GraphWalker is replaced by LocalGraphWalkerService, a Python stand-in for
+its REST service, that also counts the TCP/IP connections that clients open.
+
+Set-ups that are compared:
+- rest:        AltWalker's Walker and GraphWalkerClient (a new connection per request)
+- rest-pooled: AltWalker's Walker and PooledGraphWalkerClient (one keep-alive connection)
+- local:       AltWalker's Walker and LocalPlanner (no requests)
+- batch:       BatchWalker, LocalPlanner and DispatchExecutor
+
+    python harness_benchmark.py
+    python harness_benchmark.py --model ../Airport/models/Components.json --steps 20000 rest-pooled batch
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import types
+
+root_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(root_directory)
+
+from altwalker.executor import PythonExecutor
+from altwalker.graphwalker import GraphWalkerClient
+from altwalker.planner import OnlinePlanner
+from altwalker.reporter import Reporter
+from altwalker.walker import Walker
+
+from mbt_tools.executor import DispatchExecutor
+from mbt_tools.graphwalker import PooledGraphWalkerClient
+from mbt_tools.planner import LocalPlanner
+from mbt_tools.rest_service import LocalGraphWalkerService
+from mbt_tools.walker import BatchWalker
+
+SETUPS = ['rest', 'rest-pooled', 'local', 'batch']
+default_model_path = os.path.join(root_directory, 'MM1Queue', 'models', 'MM1_FIFO_with_s_and_fail.json')
+
+
+def load_model(model_path, num_steps):
+    """
+    Read the first model of a .json file, without guards: test methods that do nothing do not update the graph
+    variables that guards read, so the walk could get stuck. Vertices without outgoing edges (e.g. the end of a
+    run) get an edge 'e_benchmark_restart' back to the start.
+    :return: (dict) GraphWalker .json content with one model, and generator 'random(length(num_steps))'
+    """
+    with open(model_path, 'r') as f:
+        model_json = dict(json.load(f)['models'][0])
+    model_json['edges'] = [{key: value for key, value in edge.items() if key != 'guard'}
+                           for edge in model_json['edges']]
+
+    start_id = model_json['startElementId']
+    start_vertex_id = next((edge['targetVertexId'] for edge in model_json['edges'] if edge['id'] == start_id),
+                           start_id)
+    sources = {edge.get('sourceVertexId') for edge in model_json['edges']}
+    for vertex in model_json['vertices']:
+        if vertex['id'] not in sources:
+            model_json['edges'].append({'id': f"benchmark_restart_{vertex['id']}", 'name': 'e_benchmark_restart',
+                                        'sourceVertexId': vertex['id'], 'targetVertexId': start_vertex_id})
+    model_json['generator'] = f"random(length({num_steps}))"
+    return {'models': [model_json]}
+
+
+def trivial_test_module(models_json):
+    """:return: module with a test class per model, with a method that does nothing for every vertex and edge"""
+    module = types.ModuleType('trivial_tests')
+    for model_json in models_json['models']:
+        names = {element['name'] for element in model_json['vertices'] + model_json['edges'] if element.get('name')}
+        methods = {name: (lambda self: None) for name in names}
+        setattr(module, model_json['name'], type(model_json['name'], (), methods))
+    return module
+
+
+def run_setup(setup, models_json, seed=1):
+    """:return: (dict) steps, seconds, steps per second, and connections and requests (for the REST set-ups)"""
+    module = trivial_test_module(models_json)
+    service = None
+    if setup in ('rest', 'rest-pooled'):
+        service = LocalGraphWalkerService(seed=seed)
+        client_class = GraphWalkerClient if setup == 'rest' else PooledGraphWalkerClient
+        client = client_class(port=service.port)
+        client.load(models_json)
+        planner = OnlinePlanner(client=client)
+    else:
+        planner = LocalPlanner(seed=seed)
+        planner.load(models_json)
+
+    if setup == 'batch':
+        walker = BatchWalker(planner, DispatchExecutor(module), Reporter())
+    else:
+        walker = Walker(planner, PythonExecutor(module), Reporter())
+
+    start = time.perf_counter()
+    status = walker.run()
+    seconds = time.perf_counter() - start
+    num_steps = planner.get_statistics()['steps']
+
+    result = {'setup': setup, 'status': status, 'steps': num_steps, 'seconds': seconds,
+              'steps_per_second': num_steps / seconds}
+    if service:
+        result.update(service.statistics())
+        service.kill()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Overhead of AltWalker per step")
+    parser.add_argument('setups', nargs='*', metavar='setup', help=f"set-ups to run: {', '.join(SETUPS)} (default: all)")
+    parser.add_argument('--model', default=default_model_path, help="GraphWalker .json file")
+    parser.add_argument('--steps', type=int, default=5000, help="length of the walk")
+    args = parser.parse_args(argv)
+    unknown = [setup for setup in args.setups if setup not in SETUPS]
+    if unknown:
+        parser.error(f"unknown set-up(s): {', '.join(unknown)}")
+
+    models_json = load_model(args.model, args.steps)
+    print(f"Model {models_json['models'][0]['name']}, {args.steps} steps")
+    print(f"{'set-up':<14}{'steps/s':>12}{'us/step':>10}{'connections':>13}{'requests':>10}")
+    for setup in args.setups or SETUPS:
+        result = run_setup(setup, models_json)
+        print(f"{setup:<14}{result['steps_per_second']:>12.0f}{result['seconds'] / result['steps'] * 1e6:>10.1f}"
+              f"{result.get('connections', '-'):>13}{result.get('requests', '-'):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Benchmarks of the three systems under test, without AltWalker or GraphWalker.
+- MM1Queue/MM1_new.py (Salabim): events per second, for several simulation end times
+- Airport/tests/Airport.py (Mesa): ticks per second, peak memory, and time per tick per number of passengers,
+  for several mean inter-arrival times
+- TwoWaySwitch/TwoWaySwitch.py (Mesa): ticks per second, peak memory and time per tick, for several numbers of switches
+
+Every size is run with several seeds. Results are written to benchmarks/results/<time>_<commit>.json, and compared
+with the previous results file: a throughput that drops, or a peak memory that grows, by more than the threshold
+(default 20 %, as timings of short runs vary) is reported as a regression. The script then exits with status 1.
+
+    python sut_benchmarks.py                   # all benchmarks, compare with the latest results
+    python sut_benchmarks.py --quick mm1       # small sizes of one benchmark
+    python sut_benchmarks.py --baseline results/20240101-120000_abc1234.json --threshold 0.2
+"""
+import argparse
+import datetime
+import glob
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+root_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+results_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+## Sizes per benchmark: (quick, full)
+SIZES = {
+    'mm1': ([1000, 10000], [1000, 10000, 100000]), # Simulation end time
+    'airport': ([50, 20], [100, 50, 20, 10]), # Mean inter-arrival time of passengers, in ticks
+    'room': ([2, 100], [2, 10, 100, 1000]), # Number of switches
+}
+TICKS = {'airport': (2000, 10000), 'room': (1000, 5000)} # Ticks per run: (quick, full)
+SEEDS = [1, 2, 3]
+REQUIREMENTS = {'mm1': 'salabim', 'airport': 'mesa', 'room': 'mesa'} # Package that each SUT is written in
+
+## Metrics that are compared between results; True if a higher value is better
+METRICS = {'events_per_second': True, 'ticks_per_second': True, 'peak_memory_kib': False}
+
+
+def _load_module(name, path):
+    """Import a module from a file, as a new module object: the airport SUT keeps its state in module globals"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _peak_memory(function):
+    """:return: (float) peak memory in KiB that Python allocated while running function"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _time_per_tick_by_count(tick_times):
+    """:param tick_times: list of (number of agents, seconds). :return: (dict) number: mean time per tick in us"""
+    by_count = {}
+    for count, seconds in tick_times:
+        by_count.setdefault(count, []).append(seconds)
+    return {count: statistics.mean(times) * 1e6 for count, times in sorted(by_count.items())}
+
+
+## Benchmarks. Each returns a dict of metrics for one size and seed
+def benchmark_mm1(t_end, seed):
+    MM1 = _load_module('MM1_new_benchmark', os.path.join(root_directory, 'MM1Queue', 'MM1_new.py'))
+    model = MM1.MM1Model(seed=seed)
+
+    num_events = 0
+    start = time.perf_counter()
+    while model.env.now() < t_end: # One step per event, as the test package does
+        model.step()
+        num_events += 1
+    seconds = time.perf_counter() - start
+    return {'events': num_events, 'seconds': seconds, 'events_per_second': num_events / seconds}
+
+
+def benchmark_airport(mean_inter_arrival_time, seed, num_ticks=10000, measure_memory=True):
+    import scipy.stats as stats
+    Airport = _load_module('Airport_benchmark', os.path.join(root_directory, 'Airport', 'tests', 'Airport.py'))
+    distributions = dict(Airport.distributions)
+    distributions['Arrivals'] = stats.uniform(loc=max(mean_inter_arrival_time - 10, 0), scale=20)
+
+    def create():
+        return Airport.Airport(seed=seed, distributions=distributions, logger_level=logging.ERROR,
+                               show_messages=False)
+
+    model = create()
+    tick_times = []
+    start = time.perf_counter()
+    for tick in range(num_ticks):
+        tick_start = time.perf_counter()
+        model.step()
+        # Passengers are scheduled with the PassengerSource
+        tick_times.append((model.schedule.get_agent_count() - 1, time.perf_counter() - tick_start))
+    seconds = time.perf_counter() - start
+
+    result = {'ticks': num_ticks, 'seconds': seconds, 'ticks_per_second': num_ticks / seconds,
+              'max_passengers': max(count for count, _ in tick_times),
+              'us_per_tick_by_passengers': _time_per_tick_by_count(tick_times)}
+    if measure_memory: # Separate run, because tracemalloc slows down allocations
+        model = create()
+        result['peak_memory_kib'] = _peak_memory(lambda: [model.step() for tick in range(num_ticks)])
+    return result
+
+
+def benchmark_room(num_switches, seed, num_ticks=5000, measure_memory=True):
+    TwoWaySwitch = _load_module('TwoWaySwitch_benchmark', os.path.join(root_directory, 'TwoWaySwitch', 'TwoWaySwitch.py'))
+
+    model = TwoWaySwitch.Room(seed=seed, num_switches=num_switches)
+    start = time.perf_counter()
+    for tick in range(num_ticks):
+        model.step()
+    seconds = time.perf_counter() - start
+
+    result = {'ticks': num_ticks, 'seconds': seconds, 'ticks_per_second': num_ticks / seconds,
+              'us_per_tick_by_switches': {num_switches: seconds / num_ticks * 1e6}}
+    if measure_memory:
+        model = TwoWaySwitch.Room(seed=seed, num_switches=num_switches)
+        result['peak_memory_kib'] = _peak_memory(lambda: [model.step() for tick in range(num_ticks)])
+    return result
+
+
+def run_benchmarks(names, quick=False, seeds=SEEDS):
+    """
+    :param names: list of benchmark names, keys of SIZES
+    :param quick: (bool) small sizes and fewer ticks
+    :return: (dict) name: list of {'size', 'seed', metrics...}, and 'summary': median of every metric per size
+    """
+    functions = {'mm1': benchmark_mm1, 'airport': benchmark_airport, 'room': benchmark_room}
+    results = {}
+    for name in names:
+        if importlib.util.find_spec(REQUIREMENTS[name]) is None:
+            print(f"{name:<8} skipped: package '{REQUIREMENTS[name]}' is not installed")
+            continue
+        sizes = SIZES[name][0 if quick else 1]
+        kwargs = {'num_ticks': TICKS[name][0 if quick else 1]} if name in TICKS else {}
+        results[name] = []
+        for size in sizes:
+            for seed in seeds:
+                result = functions[name](size, seed, **kwargs)
+                result.update({'size': size, 'seed': seed})
+                results[name].append(result)
+                print(f"{name:<8} size {size:<8} seed {seed}: " +
+                      ', '.join(f"{metric} = {result[metric]:.1f}" for metric in METRICS if metric in result))
+    return results
+
+
+def summarize(results):
+    """:return: (dict) 'name/size': median of every metric in METRICS over the seeds"""
+    summary = {}
+    for name, runs in results.items():
+        for size in dict.fromkeys(run['size'] for run in runs):
+            runs_of_size = [run for run in runs if run['size'] == size]
+            summary[f"{name}/{size}"] = {metric: statistics.median(run[metric] for run in runs_of_size)
+                                         for metric in METRICS if metric in runs_of_size[0]}
+    return summary
+
+
+def compare(summary, baseline_summary, threshold=0.2):
+    """
+    :param threshold: (float) relative change that counts as a regression, e.g. 0.1 for 10 %
+    :return: (list) messages, one per metric that regressed
+    """
+    regressions = []
+    for key, metrics in summary.items():
+        for metric, value in metrics.items():
+            baseline = baseline_summary.get(key, {}).get(metric)
+            if not baseline:
+                continue
+            change = (value - baseline) / baseline
+            if (METRICS[metric] and change < -threshold) or (not METRICS[metric] and change > threshold):
+                regressions.append(f"{key} {metric}: {baseline:.1f} -> {value:.1f} ({change * 100:+.1f} %)")
+    return regressions
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root_directory, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    versions = {}
+    for package in ('salabim', 'mesa', 'numpy', 'scipy'):
+        try:
+            versions[package] = __import__(package).__version__
+        except (ImportError, AttributeError):
+            versions[package] = None
+    return {'commit': commit or 'unknown', 'python': platform.python_version(), 'platform': platform.platform(),
+            'packages': versions, 'time': datetime.datetime.now().isoformat(timespec='seconds')}
+
+
+def latest_results_file():
+    files = sorted(glob.glob(os.path.join(results_directory, '*.json')))
+    return files[-1] if files else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the systems under test")
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(SIZES)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help="small sizes and fewer ticks")
+    parser.add_argument('--baseline', help="results file to compare with (default: latest in benchmarks/results)")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative change that is a regression")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in SIZES]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    baseline_file = args.baseline or latest_results_file()
+    baseline = None
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+    results = run_benchmarks(args.names or list(SIZES), quick=args.quick)
+    content = {'environment': _environment(), 'quick': args.quick, 'results': results,
+               'summary': summarize(results)}
+
+    os.makedirs(results_directory, exist_ok=True)
+    file = os.path.join(results_directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{content['environment']['commit']}.json")
+    with open(file, 'w') as f:
+        json.dump(content, f, indent=1)
+    print(f"Results written to {file}")
+
+    if baseline:
+        if baseline.get('quick') != args.quick:
+            print(f"Not compared with {baseline_file}: it was run with other sizes (--quick).")
+            return 0
+        regressions = compare(content['summary'], baseline['summary'], args.threshold)
+        print(f"Compared with {baseline_file} (commit {baseline['environment']['commit']}): "
+              f"{len(regressions)} regression(s)")
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Helpers that are shared by the test packages in this repository.
+They extend AltWalker: each module can be used next to, or instead of, its AltWalker counterpart.
+"""
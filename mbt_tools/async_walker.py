@@ -0,0 +1,194 @@
+"""
+Walker that runs on an asyncio event loop.
+AltWalker's Walker waits for every request to the planner. AsyncWalker requests the next step (and its graph
+variables) while the test method of the current step advances the SUT, whenever the choice of the next step
+can not depend on graph variables that the test changes. Otherwise it falls back to lock-step.
+Requests to GraphWalker are sent from a thread, so that one event loop can drive many walks at the same time:
+
+    walkers = [AsyncWalker(planner, executor, reporter, models=[(model_path, stop_condition)]) for ...]
+    statuses = run_walks(walkers)
+
+Test methods are run in the thread of the event loop, one at a time. Walks that run at the same time must
+therefore have their own SUT: test packages that keep the SUT in module globals can not share one process
+(the M/M/1 tests create a model per test instance, see MM1_new.MM1Model).
+"""
+import asyncio
+import functools
+import traceback
+
+from altwalker.exceptions import GraphWalkerException
+from altwalker.walker import Walker
+
+from .planner import compile_model, read_models
+
+
+def prefetch_is_safe(model, element_id):
+    """
+    True if the step after an element can be requested before the test of the element has run:
+    choosing it reads no graph variables, and its actions only assign constants.
+    :param model: Model, see 'planner'
+    :param element_id: (str) id of the current element
+    """
+    element = model.elements.get(element_id)
+    if element is None:
+        return False
+    if element.is_edge:
+        candidates = [model.elements[element.target_id]]
+    else:
+        candidates = model.out_edges[element.id]
+        if not candidates or model.out_guard_reads[element.id]:
+            return False
+    return not any(candidate.action_reads for candidate in candidates)
+
+
+class AsyncWalker(Walker):
+    """
+    Walker with the same steps, fixtures and reports as AltWalker's Walker, that is run with 'await walker.run()'.
+    Fixtures (setUpRun, setUpModel, ...) are executed as by AltWalker's Walker.
+    """
+    def __init__(self, planner, executor, reporter, models=None):
+        """
+        :param models: list of tuples (path to .json file, generator), as for GraphWalkerService. Needed to know
+            when the next step may be requested early; not needed for a LocalPlanner. Without it, steps are lock-step.
+        """
+        super().__init__(planner, executor, reporter)
+        if hasattr(planner, 'model'): # A LocalPlanner, also when wrapped (StepProfile.planner(), WalkRecorder)
+            self.model = planner.model
+            self.planner_in_thread = False # No requests to wait for
+        else:
+            self.model = compile_model(read_models(models)['models'][0]) if models else None
+            self.planner_in_thread = True
+        self.num_prefetched = 0
+
+    async def _call(self, function, *args):
+        if not self.planner_in_thread:
+            return function(*args)
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))
+
+    def _next_step(self):
+        """Requests for the next step, sent one after the other in one call, so that they all overlap the test"""
+        if not self._planner.has_next():
+            return None
+        return self._planner.get_next(), self._planner.get_data()
+
+    async def _request_next(self):
+        """:return: (tuple) next step and graph variables, or None at the end of the walk"""
+        try:
+            return await self._call(self._next_step)
+        except GraphWalkerException as ex:
+            self._reporter.error(None, str(ex))
+            self._status = False
+            return None
+
+    async def run(self):
+        """Run tests. :return: (bool) status of the run"""
+        self._reporter.start()
+        await self._call(self._planner.restart)
+        self._executor.reset()
+        self._status = self._setUpRun()
+
+        next_step = self._request_next() if self._status else None
+        while next_step is not None:
+            result = await next_step
+            next_step = None
+            if result is None:
+                break
+            step, data = result
+
+            if step["modelName"] not in self._models:
+                self._status = self._setUpModel(step["modelName"])
+
+                # if setUpModel failed stop executing steps
+                if not self._status:
+                    break
+                data = await self._call(self._planner.get_data) # setUpModel may have changed graph variables
+
+            if not step.get("name"):
+                next_step = self._request_next()
+                continue
+
+            ## Request the next step while this step is executed, if the test can not change its choice
+            if self.model is not None and prefetch_is_safe(self.model, step.get("id")):
+                next_step = asyncio.ensure_future(self._request_next())
+                await asyncio.sleep(0) # Let the task send the requests before the test blocks the event loop
+                self.num_prefetched += 1
+
+            self._status = await self._run_step_async(step, data, next_step)
+            step["status"] = self._status
+
+            if not self._status:
+                if next_step is not None:
+                    await next_step # The walk ends; the request that is on its way is not used
+                break
+            if next_step is None:
+                next_step = self._request_next()
+
+        status = self._tearDownModels()
+        self._status = self._status & status
+
+        status = self._tearDownRun()
+        self._status = self._status & status
+
+        self._reporter.end(statistics=await self._call(self._planner.get_statistics), status=self._status)
+        return self._status
+
+    async def _run_step_async(self, step, data, next_step):
+        if not self._executor.has_step(step.get("modelName"), step.get("name")):
+            if next_step is not None:
+                await next_step
+            await self._call(self._planner.fail, "Step not found.")
+            self._reporter.error(
+                step,
+                "Step not found.\nUse the 'verify' command to validate the test code against the model(s)."
+            )
+            return False
+
+        try:
+            self._reporter.step_start(step)
+            step_result = self._executor.execute_step(step.get("modelName"), step.get("name"), dict(data))
+            self._reporter.step_end(step, step_result)
+
+            assigned = set()
+            if next_step is not None:
+                # The next step is planned already: graph variables that its actions assign are not overwritten
+                result = await next_step
+                if result is not None:
+                    next_element = self.model.elements.get(result[0].get("id"))
+                    assigned = next_element.action_writes if next_element is not None else set()
+
+            data_after = step_result.get("data") or {}
+            changed = {key: value for key, value in data_after.items()
+                       if key not in assigned and (key not in data or data[key] != value)}
+            for key, value in changed.items():
+                await self._call(self._planner.set_data, key, value)
+            if next_step is not None and next_step.result() is not None:
+                next_step.result()[1].update(changed) # Graph variables for the next step
+
+            error = step_result.get("error")
+            if error:
+                await self._call(self._planner.fail, error["message"])
+
+            return error is None
+        except Exception as e:
+            if next_step is not None and not next_step.done():
+                await asyncio.wait([next_step])
+            await self._call(self._planner.fail, str(e))
+            self._reporter.error(step, str(e), trace=str(traceback.format_exc()))
+
+            return False
+
+
+def run_walks(walkers):
+    """
+    Run several AsyncWalkers at the same time on one event loop.
+    :param walkers: list of AsyncWalker, each with its own planner, executor and SUT
+    :return: (list) status of each run
+    """
+    async def run_all():
+        return await asyncio.gather(*(walker.run() for walker in walkers))
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run_all())
+    finally:
+        loop.close()
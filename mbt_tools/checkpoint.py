@@ -0,0 +1,153 @@
+"""
+Checkpoints of long walks, and resuming a walk from its last checkpoint.
+A checkpoint holds the state of the LocalPlanner (position in the model, statistics, graph variables and random
+generator), the models that were set up, the attributes of the test class instances (e.g. 'mem_num_in_system'),
+and the state of the SUT. All are pickled together, so that test instances that refer to SUT objects
+(e.g. 'self.component' in the airport tests) refer to the same objects after resuming.
+
+The test module decides how its SUT is saved, with two optional functions:
+
+    def checkpoint_sut():
+        return model1 # Any object that can be pickled
+
+    def restore_sut(state, instances):
+        global model1
+        model1 = state # instances: dict of class name: test instance, with its attributes restored
+
+Walks planned by GraphWalker can not be resumed: GraphWalker's REST API can not set the position of a walk.
+
+    walker = CheckpointWalker(planner, executor, reporter, file='checkpoint.pkl', interval=10000)
+    walker.run()
+    ...
+    walker = resume('checkpoint.pkl', executor, reporter) # After a crash, in a new process
+    walker.run()
+"""
+import os
+import pickle
+import time
+
+from .planner import LocalPlanner
+from .walker import BatchWalker
+
+CHECKPOINT_VERSION = 1
+
+
+def _test_attributes(instance):
+    """Attributes that a test instance got after it was created, e.g. in setUpModel"""
+    initial = set(vars(type(instance)()))
+    return {key: value for key, value in vars(instance).items() if key not in initial}
+
+
+def read_checkpoint(file):
+    """:return: (dict) content of a checkpoint file"""
+    with open(file, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint {file} has version {state.get('version')}, expected {CHECKPOINT_VERSION}.")
+    return state
+
+
+def restore_planner(state):
+    """:return: LocalPlanner with the model of a checkpoint; its walk continues when CheckpointWalker starts"""
+    planner = LocalPlanner()
+    planner.load(state['models_json'])
+    return planner
+
+
+class CheckpointWalker(BatchWalker):
+    """
+    BatchWalker that writes a checkpoint every 'interval' steps and/or 'seconds' seconds, between runs of steps.
+    Needs a LocalPlanner, which may be wrapped, e.g. by StepProfile. The checkpoint file is replaced atomically, so a crash while writing keeps the previous one.
+    """
+    def __init__(self, planner, executor, reporter, file='checkpoint.pkl', interval=10000, seconds=None,
+                 max_steps=100, state=None):
+        """
+        :param file: (str) path to the checkpoint file
+        :param interval: (int) number of steps between checkpoints, or None
+        :param seconds: (float) seconds between checkpoints, or None
+        :param state: (dict) checkpoint to resume from, see resume()
+        """
+        if not hasattr(planner, 'get_state'):
+            raise TypeError("CheckpointWalker needs a LocalPlanner: the state of GraphWalker can not be saved.")
+        super().__init__(planner, executor, reporter, max_steps=max_steps)
+        self.file = file
+        self.interval = interval
+        self.seconds = seconds
+        self.num_checkpoints = 0
+        self._state = state
+        self._last_steps = 0
+        self._last_time = time.time()
+
+    @property
+    def planner(self):
+        """Planner of the walk, e.g. for get_data() after a resumed walk"""
+        return self._planner
+
+    ## Writing checkpoints
+    def _end_of_batch(self):
+        steps = self._planner.path_length
+        if (self.interval and steps - self._last_steps >= self.interval) or \
+                (self.seconds and time.time() - self._last_time >= self.seconds):
+            self.save()
+
+    def save(self):
+        """Write a checkpoint now. Should be called between runs of steps, when no changes are pending."""
+        module = self._executor._module
+        instances = self._executor._instances
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'models_json': self._planner.models_json,
+            'planner': self._planner.get_state(),
+            'models': list(self._models),
+            'instances': {name: _test_attributes(instance) for name, instance in instances.items()},
+            'sut': module.checkpoint_sut() if hasattr(module, 'checkpoint_sut') else None,
+            'time': time.time(),
+        }
+        temporary_file = self.file + '.tmp'
+        try:
+            with open(temporary_file, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file, self.file)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            # The walk goes on without checkpoints, e.g. when the SUT holds generators
+            self._reporter.error(None, f"Checkpoint could not be written, checkpoints are turned off: {error}")
+            self.interval = self.seconds = None
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            return
+        self.num_checkpoints += 1
+        self._last_steps = self._planner.path_length
+        self._last_time = time.time()
+
+    ## Resuming
+    def _start_run(self):
+        if self._state is None:
+            return super()._start_run()
+
+        state, self._state = self._state, None
+        self._planner.set_state(state['planner'])
+        self._executor.reset()
+        instances = {}
+        for name, attributes in state['instances'].items():
+            self._executor._setup_class(name)
+            instances[name] = self._executor._instances[name]
+            instances[name].__dict__.update(attributes)
+        self._models = list(state['models']) # setUpRun and setUpModel are not run again
+
+        module = self._executor._module
+        if hasattr(module, 'restore_sut'):
+            module.restore_sut(state['sut'], instances)
+        self._last_steps = self._planner.path_length
+        return True
+
+
+def resume(file, executor, reporter, **kwargs):
+    """
+    Continue a walk from its last checkpoint.
+    :param file: (str) path to the checkpoint file
+    :param executor: executor with the same test package, e.g. create_dispatch_executor("tests")
+    :param kwargs: arguments for CheckpointWalker, e.g. interval
+    :return: CheckpointWalker, that continues the walk with run(), and keeps writing checkpoints to the same file
+    """
+    state = read_checkpoint(file)
+    return CheckpointWalker(restore_planner(state), executor, reporter, file=file, state=state, **kwargs)
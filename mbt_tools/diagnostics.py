@@ -0,0 +1,77 @@
+"""
+Diagnostics for test packages, instead of warnings.warn in test methods.
+warnings.warn with a unique message on every step (e.g. f'{self.time}: ARRIVAL ...') formats the message, matches
+it against the warning filters and adds it to the warning registry of the module, that grows with every message.
+Diagnostics counts messages per category, and formats and keeps only the first examples of each category.
+A summary is written at the end of a run:
+
+    diagnostics = Diagnostics()
+
+    def tearDownRun():
+        diagnostics.emit()
+
+    class Component(unittest.TestCase):
+        def e_arrival(self):
+            diagnostics.note('arrival', '{}: ARRIVAL {}', self.time, self.component_name)
+"""
+import sys
+
+
+class Diagnostics:
+    """Counts of messages per category, with the first max_examples messages of each category"""
+    def __init__(self, max_examples=5, name='Diagnostics'):
+        """
+        :param max_examples: (int) number of messages that are kept per category
+        :param name: (str) title of the summary
+        """
+        self.max_examples = max_examples
+        self.name = name
+        self.counts = {} # Category: number of messages
+        self.examples = {} # Category: list of formatted messages
+
+    def note(self, category, message, *args):
+        """
+        Count a message. It is only formatted if it is one of the first examples of its category.
+        :param category: (str) e.g. 'arrival'
+        :param message: (str) message, or format string for args, e.g. '{}: ARRIVAL {}'; or a function without
+            arguments that returns the message, e.g. lambda: f"Queue length is {queue.length()}"
+        :param args: arguments for the format string
+        """
+        count = self.counts.get(category, 0)
+        self.counts[category] = count + 1
+        if count < self.max_examples:
+            if callable(message):
+                message = message()
+            elif args:
+                message = message.format(*args)
+            self.examples.setdefault(category, []).append(message)
+
+    def count(self, category):
+        return self.counts.get(category, 0)
+
+    def summary(self):
+        """:return: (str) number of messages and examples per category, or '' if there were no messages"""
+        if not self.counts:
+            return ''
+        lines = [f"{self.name}: {sum(self.counts.values())} message(s) in {len(self.counts)} categories"]
+        for category, count in self.counts.items():
+            lines.append(f"  {category}: {count}")
+            for example in self.examples.get(category, []):
+                lines.append(f"    {example}")
+            if count > self.max_examples:
+                lines.append(f"    ... {count - self.max_examples} more")
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.counts = {}
+        self.examples = {}
+
+    def emit(self, file=None):
+        """
+        Write the summary, and start counting again, e.g. for the next run.
+        :param file: file object to write to, default: sys.stderr (where warnings are written)
+        """
+        text = self.summary()
+        if text:
+            print(text, file=file or sys.stderr)
+        self.reset()
@@ -0,0 +1,130 @@
+"""
+Python executor with a dispatch table of test methods.
+AltWalker's PythonExecutor looks up the method, inspects its signature, copies the graph variables and
+captures stdout for every step. DispatchExecutor does the lookup and inspection once per test class, and
+recognises test methods that do nothing (only a docstring, 'pass' or 'return'). These are reported as passed
+without being called: in long walks most steps are such self-edges.
+"""
+import copy
+import dis
+import inspect
+import os
+
+from altwalker.exceptions import ExecutorException
+from altwalker.executor import PythonExecutor, get_step_result, load
+
+_IGNORED_INSTRUCTIONS = {'RESUME', 'NOP', 'CACHE', 'EXTENDED_ARG'}
+_FLAT_TYPES = (int, float, str, bool, type(None))
+
+
+def is_empty_function(function):
+    """True if a function has no effect and returns None, e.g. a method with only a docstring and 'pass'"""
+    if not inspect.isfunction(function):
+        return False
+    instructions = [(instruction.opname, instruction.argval) for instruction in dis.get_instructions(function)
+                    if instruction.opname not in _IGNORED_INSTRUCTIONS]
+    return instructions in ([('LOAD_CONST', None), ('RETURN_VALUE', None)], [('RETURN_CONST', None)])
+
+
+class TestMethod:
+    """Entry of the dispatch table"""
+    def __init__(self, function, num_args):
+        self.function = function
+        self.num_args = num_args # Without 'self'
+        self.is_empty = is_empty_function(function)
+
+
+def dispatch_table(cls):
+    """
+    Test methods of a test class, with the number of arguments that they take.
+    :param cls: class in the test module, e.g. MM1_FIFO_with_s_and_fail
+    :return: (dict) name: TestMethod
+    """
+    table = {}
+    for name in dir(cls):
+        function = inspect.getattr_static(cls, name, None)
+        if name.startswith('__') or not inspect.isfunction(function):
+            continue
+        table[name] = TestMethod(function, len(inspect.signature(function).parameters) - 1)
+    return table
+
+
+class DispatchExecutor(PythonExecutor):
+    """
+    Drop-in replacement for AltWalker's PythonExecutor:
+
+        executor = create_dispatch_executor("tests")
+        walker = BatchWalker(planner, executor, reporter)
+    """
+    def __init__(self, module=None):
+        super().__init__(module)
+        self._tables = {}
+        self.num_empty_steps = 0
+        if module is not None:
+            self._build_tables()
+
+    def _build_tables(self):
+        """Build the dispatch table of every class in the test module, once"""
+        self._tables = {name: dispatch_table(cls) for name, cls in vars(self._module).items()
+                        if isinstance(cls, type)}
+
+    def load(self, path):
+        super().load(path)
+        self._build_tables()
+
+    def _test_method(self, model_name, name):
+        table = self._tables.get(model_name)
+        return table.get(name) if table is not None else None
+
+    def has_step(self, model_name, name):
+        if model_name is not None and self._test_method(model_name, name) is not None:
+            return True
+        return super().has_step(model_name, name)
+
+    def is_empty_step(self, model_name, name):
+        """
+        True if the test method of a step does nothing, so that it does not have to be executed.
+        The caller skips the step (see BatchWalker), so it is counted in num_empty_steps here.
+        """
+        method = self._test_method(model_name, name) if model_name else None
+        if method is not None and method.is_empty:
+            self.num_empty_steps += 1
+            return True
+        return False
+
+    def execute_step(self, model_name, name, data=None):
+        method = self._test_method(model_name, name) if model_name else None
+        if method is None: # Fixtures, and methods that are not plain functions
+            return super().execute_step(model_name, name, data)
+
+        if method.is_empty:
+            self.num_empty_steps += 1
+            return {'output': '', 'data': dict(data) if data else {}}
+
+        # Graph variables are numbers, strings and booleans: a shallow copy is enough
+        if data and all(isinstance(value, _FLAT_TYPES) for value in data.values()):
+            data = dict(data)
+        else:
+            data = copy.deepcopy(data) if data else {}
+
+        self._setup_class(model_name)
+        instance = self._instances[model_name]
+        if method.num_args == 0:
+            step_result = get_step_result(method.function, instance)
+        elif method.num_args == 1:
+            step_result = get_step_result(method.function, instance, data)
+        else:
+            raise ExecutorException(f"The method {model_name}.{name} must take 0 or 1 parameters "
+                                    f"but it expects {method.num_args} parameters.")
+        step_result['data'] = data
+        return step_result
+
+
+def create_dispatch_executor(path):
+    """
+    Load the test package from a path, as AltWalker's create_executor(path, executor_type='python') does.
+    :param path: path to the folder with test.py, e.g. "tests"
+    :return: DispatchExecutor
+    """
+    path, package = os.path.split(path.rstrip(os.path.sep))
+    return DispatchExecutor(load(path, package, "test"))
@@ -0,0 +1,260 @@
+"""
+Translation of GraphWalker guards and actions to Python.
+GraphWalker evaluates guards such as 't>0 && q==1' and actions such as 'q=q+a; ticks++;' as JavaScript.
+Only the subset of JavaScript that is used in abstract models is supported: numbers, strings, booleans,
+graph variables, arithmetic, comparisons, logical operators, assignments, and increments.
+"""
+import math
+import re
+
+## Tokens of the supported JavaScript subset
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<name>[A-Za-z_$][A-Za-z0-9_$]*)
+      | (?P<operator>===|!==|==|!=|<=|>=|&&|\|\||\+\+|--|\+=|-=|\*=|/=|[-+*/%<>!=()])
+    )""", re.VERBOSE)
+
+_CONSTANTS = {'true': 'True', 'false': 'False', 'null': 'None', 'undefined': 'None'}
+
+# Binary operators from lowest to highest precedence, with their Python equivalents
+_BINARY_OPERATORS = [
+    {'||': 'or'},
+    {'&&': 'and'},
+    {'==': '==', '!=': '!=', '===': '==', '!==': '!='},
+    {'<': '<', '>': '>', '<=': '<=', '>=': '>='},
+    {'+': '+', '-': '-'},
+    {'*': '*', '/': '/', '%': '%'},
+]
+
+_ASSIGNMENT_OPERATORS = {'=': None, '+=': '+', '-=': '-', '*=': '*', '/=': '/'}
+
+DATA_NAME = '_data' # Name of the dictionary with graph variables in translated code
+
+
+class ExpressionError(ValueError):
+    """Raised when a guard or action can not be translated."""
+
+
+def tokenize(source):
+    """
+    Split a JavaScript expression into tokens.
+    :param source: (str) guard or action
+    :return: (list) tuples of (kind, text)
+    """
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = _TOKEN_PATTERN.match(source, position)
+        if not match or match.end() == position:
+            raise ExpressionError(f"Unsupported syntax in '{source}' at position {position}.")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser that writes Python source for a token list.
+    Every binary operation is put between brackets, so that JavaScript precedence is kept.
+    Names of graph variables that are read or written are collected on the way.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.tokens = tokenize(source)
+        self.position = 0
+        self.reads = set()
+        self.writes = set()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, text=None):
+        kind, token = self.peek()
+        if kind is None or (text is not None and token != text):
+            raise ExpressionError(f"Expected '{text}' in '{self.source}'.")
+        self.position += 1
+        return kind, token
+
+    def at_end(self):
+        return self.position >= len(self.tokens)
+
+    def variable(self, name):
+        return f'{DATA_NAME}[{name!r}]'
+
+    ## Expressions
+    def expression(self, level=0):
+        if level == len(_BINARY_OPERATORS):
+            return self.unary()
+        left = self.expression(level + 1)
+        operators = _BINARY_OPERATORS[level]
+        while self.peek()[0] == 'operator' and self.peek()[1] in operators:
+            _, token = self.take()
+            right = self.expression(level + 1)
+            left = f'({left} {operators[token]} {right})'
+        return left
+
+    def unary(self):
+        kind, token = self.peek()
+        if kind == 'operator' and token == '!':
+            self.take()
+            return f'(not {self.unary()})'
+        if kind == 'operator' and token in ('-', '+'):
+            self.take()
+            return f'({token}{self.unary()})'
+        return self.primary()
+
+    def primary(self):
+        kind, token = self.take()
+        if kind == 'number' or kind == 'string':
+            return token
+        if kind == 'name':
+            if token in _CONSTANTS:
+                return _CONSTANTS[token]
+            self.reads.add(token)
+            return self.variable(token)
+        if token == '(':
+            inner = self.expression()
+            self.take(')')
+            return f'({inner})'
+        raise ExpressionError(f"Unexpected '{token}' in '{self.source}'.")
+
+    ## Statements
+    def statement(self):
+        kind, token = self.peek()
+        if kind == 'operator' and token in ('++', '--'): # Prefix increment
+            self.take()
+            kind, name = self.take()
+            if kind != 'name':
+                raise ExpressionError(f"Expected a graph variable after '{token}' in '{self.source}'.")
+            return self.increment(name, token)
+        if kind == 'name' and token in ('var', 'let'):
+            self.take()
+            kind, token = self.peek()
+        if kind != 'name':
+            raise ExpressionError(f"Action must start with a graph variable: '{self.source}'.")
+        self.take()
+        _, operator = self.take()
+        if operator in ('++', '--'): # Postfix increment
+            return self.increment(token, operator)
+        if operator not in _ASSIGNMENT_OPERATORS:
+            raise ExpressionError(f"Unsupported operator '{operator}' in action '{self.source}'.")
+        value = self.expression()
+        if _ASSIGNMENT_OPERATORS[operator]:
+            self.reads.add(token)
+            value = f'({self.variable(token)} {_ASSIGNMENT_OPERATORS[operator]} {value})'
+        self.writes.add(token)
+        return f'{self.variable(token)} = {value}'
+
+    def increment(self, name, operator):
+        self.reads.add(name)
+        self.writes.add(name)
+        return f"{self.variable(name)} = {self.variable(name)} {operator[0]} 1"
+
+
+def translate_guard(guard):
+    """
+    Translate a guard to a Python expression on the dictionary '_data'.
+    :param guard: (str) e.g. 'd==1 && a==0 && q>1'
+    :return: (str) Python expression, (set) names of graph variables that are read
+    """
+    parser = _Parser(guard)
+    source = parser.expression()
+    if not parser.at_end():
+        raise ExpressionError(f"Unexpected '{parser.peek()[1]}' in guard '{guard}'.")
+    return source, parser.reads
+
+
+def split_statements(action):
+    """Split an action such as 'q = 1;a = 0;' into its statements. A ';' in a string literal does not split."""
+    statements = []
+    start = 0
+    quote = None # Quote character of the string literal that is being read, if any
+    escaped = False
+    for index, character in enumerate(action):
+        if escaped:
+            escaped = False
+        elif quote:
+            if character == '\\':
+                escaped = True
+            elif character == quote:
+                quote = None
+        elif character in '"\'':
+            quote = character
+        elif character == ';':
+            statements.append(action[start:index])
+            start = index + 1
+    statements.append(action[start:])
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def translate_action(action):
+    """
+    Translate an action to Python statements on the dictionary '_data'.
+    :param action: (str) e.g. 'q = 1;a = 0;d = 0;s = 1;'
+    :return: (str) Python statements, (set) names read, (set) names written
+    """
+    lines = []
+    reads = set()
+    writes = set()
+    for statement in split_statements(action):
+        parser = _Parser(statement)
+        lines.append(parser.statement())
+        if not parser.at_end():
+            raise ExpressionError(f"Unexpected '{parser.peek()[1]}' in action '{statement}'.")
+        reads |= parser.reads - writes # Names assigned earlier in the same action are not read from outside
+        writes |= parser.writes
+    return '\n'.join(lines), reads, writes
+
+
+## Compilation to Python functions
+def _function(body, label):
+    """Define a function of the dictionary '_data', without access to Python's builtins"""
+    namespace = {'__builtins__': {}}
+    source = f'def _function({DATA_NAME}):\n' + ''.join(f'    {line}\n' for line in body.split('\n'))
+    exec(compile(source, label, 'exec'), namespace)
+    return namespace['_function']
+
+
+def compile_guard(guard, label='<guard>'):
+    """
+    Compile a guard to a function that is called with the graph variables.
+    :param guard: (str) e.g. 'd==1 && a==0 && q>1'
+    :param label: (str) name that is shown in tracebacks
+    :return: (function) returns True if the guard holds, or None for an empty guard; (set) names that are read
+    """
+    if not guard or not guard.strip():
+        return None, set()
+    source, reads = translate_guard(guard)
+    return _function(f'return True if {source} else False', label), reads
+
+
+def compile_action(action, label='<actions>'):
+    """
+    Compile an action to a function that updates the graph variables in place.
+    :param action: (str) e.g. 'q = 1;a = 0;d = 0;s = 1;'
+    :param label: (str) name that is shown in tracebacks
+    :return: (function) or None for an empty action; (set) names read; (set) names written
+    """
+    source, reads, writes = translate_action(action or '')
+    if not source:
+        return None, reads, writes
+    return _function(source, label), reads, writes
+
+
+def format_literal(value):
+    """Write a Python value as a JavaScript literal, as GraphWalker expects it in 'setData'"""
+    if hasattr(value, 'item'): # NumPy scalar, e.g. from np.linspace: repr() would give 'np.float64(0.2)'
+        value = value.item()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+    if isinstance(value, float) and not math.isfinite(value):
+        return 'NaN' if math.isnan(value) else ('Infinity' if value > 0 else '-Infinity')
+    return repr(value)
@@ -0,0 +1,143 @@
+"""
+GraphWalker client with a persistent HTTP connection, and a GraphWalker service that can be reused.
+AltWalker's GraphWalkerClient sends every request with a new TCP/IP connection. During long walks,
+the computer system then runs out of ports (see 'Problems with TCP/IP' in the main README).
+PooledGraphWalkerClient reuses one keep-alive connection for all requests of a walk.
+ReusableGraphWalkerService keeps one Java process running for many replications.
+"""
+import json
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from altwalker.exceptions import GraphWalkerException
+from altwalker.graphwalker import GraphWalkerClient
+from altwalker.planner import OnlinePlanner
+
+from .expressions import compile_action, format_literal
+from .services import ManagedGraphWalkerService
+
+
+class PooledGraphWalkerClient(GraphWalkerClient):
+    """
+    Drop-in replacement for AltWalker's GraphWalkerClient, that sends all requests over one pooled session.
+    Use connection_statistics() to see how many requests reused the open connection.
+    """
+    def __init__(self, host='127.0.0.1', port=8887, verbose=False):
+        super().__init__(host=host, port=port, verbose=verbose)
+
+        # One connection in the pool: requests are sent one after another
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        # Proxy settings of the environment are not looked up for every request: the service runs on this network
+        self.session.trust_env = False
+
+    def _send(self, method, path, data=None):
+        try:
+            response = self.session.request(method, self.base + '/' + path.strip('/'), data=data)
+        except requests.ConnectionError as error:
+            raise GraphWalkerException(f"Could not connect to GraphWalker at {self.base}: {error}")
+        self._validate_response(response)
+        return response
+
+    ## Requests of GraphWalkerClient, sent over the session
+    def _get(self, path):
+        return self._get_body(self._send('GET', path))
+
+    def _put(self, path):
+        return self._get_body(self._send('PUT', path))
+
+    def _post(self, path, data=None):
+        return self._get_body(self._send('POST', path, data=data))
+
+    def fail(self, message):
+        self._send('PUT', '/fail/' + self._normalize_fail_message(message))
+
+    def connection_statistics(self):
+        """
+        Count requests and TCP/IP connections of this client.
+        :return: (dict) number of requests, connections opened, and requests that reused an open connection
+        """
+        pool = self.session.get_adapter(self.base).poolmanager.connection_from_url(self.base)
+        return {
+            'requests': pool.num_requests,
+            'connections_opened': pool.num_connections,
+            'connections_reused': pool.num_requests - pool.num_connections,
+        }
+
+    def close(self):
+        self.session.close()
+
+    def set_data_many(self, data):
+        """Set several graph variables with one request"""
+        if data:
+            script = ''.join(f'{key}={format_literal(value)};' for key, value in data.items())
+            self._put('/setData/' + quote(script, safe=''))
+
+
+def initial_graph_data(model_path):
+    """
+    Get the initial values of graph variables, from the actions of the (first) model in a .json file.
+    :param model_path: path to .json file
+    :return: (dict) graph variables
+    """
+    with open(model_path, 'r') as f:
+        model_json = json.load(f)['models'][0]
+    data = {}
+    initial_actions = compile_action(';'.join(model_json.get('actions', [])))[0]
+    if initial_actions is not None:
+        initial_actions(data)
+    return data
+
+
+class ReusableGraphWalkerService:
+    """
+    One GraphWalker service that is used for many replications.
+    Java is started and the model is loaded once. Between replications, reset() restarts the walk
+    and sets all graph variables back to the initial values of the model, or to new values.
+
+        gw = ReusableGraphWalkerService(model_path, stop_condition)
+        for replication in range(num_replications):
+            gw.reset({'seed': seeds[replication]})
+            walker = Walker(gw.planner(), executor, reporter)
+            walker.run()
+        gw.kill()
+    """
+    def __init__(self, model_path, stop_condition, port=None, host='127.0.0.1'):
+        """
+        :param port: (int) port for the service, or None to lease a free port (see 'services')
+        """
+        self.initial_data = initial_graph_data(model_path)
+        self.service = ManagedGraphWalkerService(models=[(model_path, stop_condition)], port=port)
+        self.client = PooledGraphWalkerClient(host=host, port=self.service.port)
+        self.num_resets = 0
+
+    def reset(self, data=None):
+        """
+        Prepare the service for a new replication.
+        :param data: (dict) graph variables to set for the new replication, on top of the initial values
+        """
+        # Variables that were added during the previous walk (e.g. results) are cleared
+        stale_keys = [key for key in self.client.get_data() if key not in self.initial_data]
+        self.client.restart()
+
+        values = {key: None for key in stale_keys}
+        values.update(self.initial_data)
+        values.update(data or {})
+        self.client.set_data_many(values)
+        self.num_resets += 1
+
+    def planner(self):
+        """OnlinePlanner for the next walk. The service is not passed on, so that it is not killed with the planner."""
+        return OnlinePlanner(client=self.client)
+
+    def kill(self):
+        self.client.close()
+        self.service.kill() # End associated Java process
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.kill()
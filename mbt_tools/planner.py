@@ -0,0 +1,472 @@
+"""
+In-process replacement for AltWalker's OnlinePlanner.
+The abstract model (.json file) is walked directly in Python, so no GraphWalker service (Java) and
+no REST requests are needed. Guards and actions are evaluated with 'expressions'.
+
+Supported path generators: random, weighted_random.
+Supported stop conditions: edge_coverage, vertex_coverage, requirement_coverage, length,
+combined with 'and'/'or' (or '&&'/'||'). Several generators can be given one after another, as in GraphWalker.
+"""
+import hashlib
+import json
+import random
+import re
+
+from altwalker.exceptions import GraphWalkerException
+from altwalker.planner import Planner
+
+from .expressions import compile_action, compile_guard
+
+## Abstract model
+class Element:
+    """A vertex or an edge of an abstract model"""
+    def __init__(self, model_name, element_json, is_edge):
+        self.model_name = model_name
+        self.id = element_json['id']
+        self.name = element_json.get('name', '')
+        self.is_edge = is_edge
+        self.properties = element_json.get('properties', {})
+        self.requirements = list(element_json.get('requirements', []))
+        self.source_id = element_json.get('sourceVertexId')
+        self.target_id = element_json.get('targetVertexId')
+
+        # Weight for 'weighted_random', as probability between 0 and 1
+        weight = element_json.get('weight')
+        if weight is None and isinstance(self.properties, dict):
+            weight = self.properties.get('weight')
+        self.weight = float(weight) if weight is not None else None
+
+        ## Compile guard and actions once, to functions of the graph variables
+        self.guard = element_json.get('guard') or ''
+        # Graph variables that the guard depends on
+        self.guard_function, self.guard_reads = compile_guard(self.guard, f'<guard {self.name}>')
+        self.actions = ';'.join(element_json.get('actions', []))
+        self.actions_function, self.action_reads, self.action_writes = \
+            compile_action(self.actions, f'<actions {self.name}>')
+
+    def step(self):
+        """Step in the format of AltWalker's GraphWalkerClient.get_next"""
+        return {'id': self.id, 'name': self.name, 'modelName': self.model_name, 'properties': self.properties}
+
+
+class Model:
+    """Vertices, edges and start element of one model in a GraphWalker .json file"""
+    def __init__(self, model_json, generator=None):
+        self.name = model_json['name']
+        self.generator = generator or model_json.get('generator', '')
+        self.vertices = [Element(self.name, vertex, is_edge=False) for vertex in model_json.get('vertices', [])]
+        self.edges = [Element(self.name, edge, is_edge=True) for edge in model_json.get('edges', [])]
+        self.elements = {element.id: element for element in self.vertices + self.edges}
+        self.requirements = {requirement for element in self.elements.values() for requirement in element.requirements}
+
+        # Outgoing edges per vertex, in the order of the .json file
+        self.out_edges = {vertex.id: [] for vertex in self.vertices}
+        for edge in self.edges:
+            if edge.source_id is not None:
+                self.out_edges[edge.source_id].append(edge)
+
+        start_id = model_json.get('startElementId')
+        if start_id not in self.elements:
+            raise GraphWalkerException(f"Model '{self.name}' has no valid start element.")
+        self.start = self.elements[start_id]
+
+        self.initial_actions_function, _, self.initial_writes = \
+            compile_action(';'.join(model_json.get('actions', [])), f'<actions {self.name}>')
+
+        # Graph variables read by the guards on the outgoing edges of each vertex
+        self.out_guard_reads = {vertex_id: set().union(*(edge.guard_reads for edge in edges))
+                                for vertex_id, edges in self.out_edges.items()}
+
+
+## Models are compiled once per content: planners that load the same file share the compiled model
+_compiled_models = {}
+
+def content_hash(model_json):
+    """SHA-256 of a model, independent of the formatting of the .json file"""
+    return hashlib.sha256(json.dumps(model_json, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def compile_model(model_json):
+    """
+    Get the compiled Model for the content of a model, from the cache if it was compiled before.
+    :param model_json: (dict) one model of a GraphWalker .json file
+    :return: Model
+    """
+    key = content_hash(model_json)
+    if key not in _compiled_models:
+        _compiled_models[key] = Model(model_json)
+    return _compiled_models[key]
+
+
+def read_models(models):
+    """
+    Read model files, in the same format that is used for GraphWalkerService(models=...).
+    :param models: list of tuples (path to .json file, generator with stop condition)
+    :return: (dict) GraphWalker .json content, with the generator of each model replaced
+    """
+    models_json = {'models': []}
+    for path, generator in models:
+        with open(path, 'r') as f:
+            content = json.load(f)
+        for model_json in content['models']:
+            model_json = dict(model_json)
+            if generator:
+                model_json['generator'] = generator
+            models_json['models'].append(model_json)
+    return models_json
+
+
+## Stop conditions
+class StopCondition:
+    def __init__(self, name, argument=None):
+        self.name = name
+        self.argument = argument
+        if name not in ('edge_coverage', 'vertex_coverage', 'requirement_coverage', 'length'):
+            raise GraphWalkerException(f"Stop condition '{name}' is not supported by LocalPlanner.")
+        if argument is None:
+            raise GraphWalkerException(f"Stop condition '{name}' needs an argument.")
+
+    def is_fulfilled(self, planner):
+        if self.name == 'length':
+            return planner.path_length >= self.argument
+        if self.name == 'edge_coverage':
+            return _percentage(planner.visited(planner.model.edges), len(planner.model.edges)) >= self.argument
+        if self.name == 'vertex_coverage':
+            return _percentage(planner.visited(planner.model.vertices), len(planner.model.vertices)) >= self.argument
+        return _percentage(len(planner.covered_requirements), len(planner.model.requirements)) >= self.argument
+
+
+class CombinedCondition:
+    def __init__(self, operator, conditions):
+        self.operator = operator
+        self.conditions = conditions
+
+    def is_fulfilled(self, planner):
+        if self.operator == 'or':
+            return any(condition.is_fulfilled(planner) for condition in self.conditions)
+        return all(condition.is_fulfilled(planner) for condition in self.conditions)
+
+
+def _percentage(part, total):
+    return 100 * part / total if total else 100
+
+
+## Parsing of generator strings, such as "weighted_random(requirement_coverage(100) or length(100000))"
+_GENERATOR_TOKEN = re.compile(r'\s*([A-Za-z_]+|\d+(?:\.\d*)?|\|\||&&|[(),])')
+
+def _tokenize_generator(text):
+    tokens = []
+    position = 0
+    while position < len(text.rstrip()):
+        match = _GENERATOR_TOKEN.match(text, position)
+        if not match:
+            raise GraphWalkerException(f"Could not parse generator '{text}'.")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def parse_generator(text):
+    """
+    Parse a GraphWalker generator string.
+    :param text: (str) e.g. "random(edge_coverage(100))"
+    :return: (list) tuples of (path generator name, stop condition)
+    """
+    tokens = _tokenize_generator(text)
+    position = 0
+
+    def take(expected=None):
+        nonlocal position
+        if position >= len(tokens) or (expected is not None and tokens[position] != expected):
+            raise GraphWalkerException(f"Could not parse generator '{text}'.")
+        position += 1
+        return tokens[position - 1]
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def condition():
+        operator = None
+        conditions = [term()]
+        while peek() is not None and peek().lower() in ('or', 'and', '||', '&&'):
+            token = take().lower()
+            token = {'||': 'or', '&&': 'and'}.get(token, token)
+            if operator and operator != token:
+                # Mixed 'and'/'or' without brackets are combined from left to right
+                conditions = [CombinedCondition(operator, conditions)]
+            operator = token
+            conditions.append(term())
+        return CombinedCondition(operator, conditions) if operator else conditions[0]
+
+    def term():
+        if peek() == '(':
+            take('(')
+            inner = condition()
+            take(')')
+            return inner
+        name = take().lower()
+        take('(')
+        argument = None
+        if peek() != ')':
+            argument = float(take())
+        take(')')
+        return StopCondition(name, argument)
+
+    generators = []
+    while position < len(tokens):
+        name = take().lower()
+        if name not in ('random', 'weighted_random'):
+            raise GraphWalkerException(f"Path generator '{name}' is not supported by LocalPlanner.")
+        take('(')
+        stop_condition = condition()
+        take(')')
+        generators.append((name, stop_condition))
+    if not generators:
+        raise GraphWalkerException(f"No generator given in '{text}'.")
+    return generators
+
+
+## Planner
+class LocalPlanner(Planner):
+    """
+    Plan test paths in Python, with the same interface as AltWalker's OnlinePlanner.
+    Can be given to AltWalker's Walker instead of an OnlinePlanner:
+
+        planner = LocalPlanner(models=[(model_path, "weighted_random(length(100))")], seed=1)
+        walker = Walker(planner, executor, reporter)
+
+    Only one model can be walked; shared states between models are not supported.
+    """
+    def __init__(self, models=None, seed=None):
+        """
+        :param models: list of tuples (path to .json file, generator with stop condition)
+        :param seed: seed for the random choices of the path generator
+        """
+        self.random = random.Random(seed)
+        self.model = None
+        if models:
+            self.load(read_models(models))
+
+    def load(self, models):
+        """
+        Load models from the content of a GraphWalker .json file.
+        :param models: (dict) with key 'models'
+        """
+        if len(models['models']) != 1:
+            raise GraphWalkerException("LocalPlanner can only walk one model at a time.")
+        self.models_json = models
+        self.model = compile_model(models['models'][0])
+        self.generators = parse_generator(self.model.generator)
+
+        # Guards are only evaluated again when a graph variable that they read has changed
+        self._version = 0 # Number of changes to graph variables
+        self._versions = {} # Per graph variable: value of _version at its last change
+        self._enabled_edges_cache = {} # Per vertex: (enabled outgoing edges, _version at evaluation)
+
+        self.data = {}
+        self._run_actions(self.model.initial_actions_function, self.model.initial_writes) # Initial values
+        self.restart()
+
+    def restart(self):
+        """
+        Go back to the start of the model.
+        Like GraphWalker, graph variables are kept: AltWalker's Walker restarts the planner at the start of a run,
+        after the test execution script has set the graph variables.
+        """
+        self.current = None
+        self.path_length = 0
+        self.visits = {}
+        self.covered_requirements = set()
+        self.generator_index = 0
+        self.fail_message = None
+
+    def visited(self, elements):
+        return sum(1 for element in elements if element.id in self.visits)
+
+    def _changed(self, key):
+        self._version += 1
+        self._versions[key] = self._version
+
+    def _run_actions(self, function, writes):
+        if function is not None:
+            function(self.data)
+            for key in writes:
+                self._changed(key)
+
+    def _guard_holds(self, edge):
+        if edge.guard_function is None:
+            return True
+        try:
+            return edge.guard_function(self.data)
+        except KeyError as error:
+            raise GraphWalkerException(f"Guard '{edge.guard}' of '{edge.name}' uses unknown graph variable {error}.")
+
+    def _enabled_edges(self, vertex):
+        """Outgoing edges of a vertex whose guards hold; taken from the cache if none of their variables changed"""
+        cached = self._enabled_edges_cache.get(vertex.id)
+        if cached is not None:
+            enabled, version = cached
+            if all(self._versions.get(key, 0) <= version for key in self.model.out_guard_reads[vertex.id]):
+                return enabled
+        enabled = [edge for edge in self.model.out_edges[vertex.id] if self._guard_holds(edge)]
+        self._enabled_edges_cache[vertex.id] = (enabled, self._version)
+        return enabled
+
+    def _stop_condition_fulfilled(self):
+        while self.generator_index < len(self.generators):
+            if not self.generators[self.generator_index][1].is_fulfilled(self):
+                return False
+            self.generator_index += 1 # Continue with the next generator, if any
+        return True
+
+    def has_next(self):
+        if self.fail_message is not None:
+            return False
+        return not self._stop_condition_fulfilled()
+
+    def _choose_edge(self, edges):
+        generator_index = min(self.generator_index, len(self.generators) - 1)
+        if self.generators[generator_index][0] == 'weighted_random':
+            weighted = [edge for edge in edges if edge.weight is not None]
+            total_weight = sum(edge.weight for edge in weighted)
+            if total_weight > 1:
+                raise GraphWalkerException(f"Weights of edges from '{self.current.name}' add up to more than 1.")
+            unweighted = [edge for edge in edges if edge.weight is None]
+            # Remaining probability is divided equally over edges without weight
+            weights = [edge.weight if edge.weight is not None else (1 - total_weight) / len(unweighted)
+                       for edge in edges]
+            if sum(weights) > 0:
+                return self.random.choices(edges, weights=weights)[0]
+        return self.random.choice(edges)
+
+    def _next_element(self):
+        if self.current is None:
+            return self.model.start
+        if self.current.is_edge:
+            return self.model.elements[self.current.target_id]
+        enabled = self._enabled_edges(self.current)
+        if not enabled:
+            raise GraphWalkerException(
+                f"No path available from '{self.current.name}': no outgoing edge has a guard that holds.")
+        return self._choose_edge(enabled)
+
+    def get_next(self):
+        element = self._next_element()
+        self.current = element
+        self._run_actions(element.actions_function, element.action_writes)
+
+        ## Keep statistics for stop conditions
+        self.path_length += 1
+        self.visits[element.id] = self.visits.get(element.id, 0) + 1
+        self.covered_requirements.update(element.requirements)
+
+        return element.step()
+
+    def _is_determined(self, element):
+        """
+        True if the element that follows 'element' can be planned without graph variables that the test may change:
+        no guard has to be evaluated to choose it, and its actions only assign constants.
+        """
+        if element.is_edge:
+            candidates = [self.model.elements[element.target_id]]
+        else:
+            candidates = self.model.out_edges[element.id]
+            if any(edge.guard_reads for edge in candidates):
+                return False
+            candidates = [edge for edge in candidates if self._guard_holds(edge)]
+        return bool(candidates) and not any(candidate.action_reads for candidate in candidates)
+
+    def get_next_steps(self, max_steps=100):
+        """
+        Get the next step, followed by as many steps as are fully determined, in one call.
+        Planning ahead stops at the first choice that depends on graph variables, because the test may
+        change them when it executes the steps. The random choices are the same as for get_next, so a seed
+        gives the same path.
+
+        Each step has key 'data': for the first step all graph variables, for the other steps only the
+        variables that are assigned by their actions. Steps that are planned after a step that fails are
+        counted in the statistics.
+        :param max_steps: (int) maximum number of steps
+        :return: (list) steps in the format of get_next
+        """
+        step = self.get_next()
+        step['data'] = dict(self.data)
+        steps = [step]
+        while len(steps) < max_steps and self._is_determined(self.current) and self.has_next():
+            changed = {}
+            data = self.data
+            self.data = changed # Actions without reads can be run on an empty dictionary
+            try:
+                step = self.get_next()
+            finally:
+                self.data = data
+            data.update(changed)
+            step['data'] = changed
+            steps.append(step)
+        return steps
+
+    def get_data(self):
+        return dict(self.data)
+
+    def get_state(self):
+        """
+        State of the walk, that can be pickled, e.g. for a checkpoint. The model itself is not included.
+        :return: (dict) position, statistics, graph variables and state of the random generator
+        """
+        return {'current_id': self.current.id if self.current is not None else None,
+                'path_length': self.path_length, 'visits': dict(self.visits),
+                'covered_requirements': set(self.covered_requirements), 'generator_index': self.generator_index,
+                'fail_message': self.fail_message, 'data': dict(self.data), 'random': self.random.getstate()}
+
+    def set_state(self, state):
+        """Continue a walk from a state of get_state, on the same model"""
+        self.current = self.model.elements[state['current_id']] if state['current_id'] is not None else None
+        self.path_length = state['path_length']
+        self.visits = dict(state['visits'])
+        self.covered_requirements = set(state['covered_requirements'])
+        self.generator_index = state['generator_index']
+        self.fail_message = state['fail_message']
+        self.data = dict(state['data'])
+        self.random.setstate(state['random'])
+        self._version += 1 # Guards are evaluated again
+        self._versions = dict.fromkeys(self.data, self._version)
+        self._enabled_edges_cache = {}
+
+    def set_data(self, key, value):
+        if key not in self.data or self.data[key] != value:
+            self._changed(key)
+        self.data[key] = value
+
+    def fail(self, message):
+        self.fail_message = message
+
+    def get_statistics(self):
+        """Statistics with the same keys as GraphWalker's 'getStatistics'"""
+        model = self.model
+        visited_edges = self.visited(model.edges)
+        visited_vertices = self.visited(model.vertices)
+        completed = self.fail_message is None and self._stop_condition_fulfilled()
+        return {
+            'totalNumberOfModels': 1,
+            'totalCompletedNumberOfModels': 1 if completed else 0,
+            'totalFailedNumberOfModels': 1 if self.fail_message is not None else 0,
+            'totalIncompleteNumberOfModels': 0 if completed or self.fail_message is not None else 1,
+            'totalNotExecutedNumberOfModels': 0 if self.path_length else 1,
+            'edgeCoverage': round(_percentage(visited_edges, len(model.edges))),
+            'vertexCoverage': round(_percentage(visited_vertices, len(model.vertices))),
+            'totalNumberOfEdges': len(model.edges),
+            'totalNumberOfVisitedEdges': visited_edges,
+            'totalNumberOfUnvisitedEdges': len(model.edges) - visited_edges,
+            'totalNumberOfVertices': len(model.vertices),
+            'totalNumberOfVisitedVertices': visited_vertices,
+            'totalNumberOfUnvisitedVertices': len(model.vertices) - visited_vertices,
+            'requirementCoverage': round(_percentage(len(self.covered_requirements), len(model.requirements))),
+            'totalNumberOfRequirement': len(model.requirements),
+            'totalNumberOfUncoveredRequirement': len(model.requirements) - len(self.covered_requirements),
+            'totalNumberOfPassedRequirement': len(self.covered_requirements),
+            'totalNumberOfFailedRequirement': 0,
+            'steps': self.path_length,
+        }
+
+    def kill(self):
+        pass # No service to stop
@@ -0,0 +1,182 @@
+"""
+Wall time per step, split into planner requests, synchronisation of graph variables, test method and SUT advance.
+The planner and the executor are wrapped, so that any walker can be profiled:
+
+    profile = StepProfile()
+    planner = profile.planner(planner)
+    executor = profile.executor(executor)
+    walker = BatchWalker(planner, executor, reporter)
+    walker.run()
+    print(profile.table())
+    profile.write_collapsed('profile.folded') # Input for flamegraph.pl or speedscope
+
+The test package marks where it advances the SUT, so that this time is not counted as time of the test method:
+
+    with sut_advance():
+        self.sut.step()
+
+sut_advance does nothing when no profile is active.
+"""
+import time
+
+BUCKETS = ('planner', 'data', 'test', 'sut')
+
+## Methods of planners whose time is counted, per bucket
+PLANNER_METHODS = {'has_next': 'planner', 'get_next': 'planner', 'get_next_steps': 'planner', 'restart': 'planner',
+                   'fail': 'planner', 'get_statistics': 'planner',
+                   'get_data': 'data', 'set_data': 'data', 'set_data_many': 'data'}
+
+_active_profile = None # Profile of the step that is being executed, see sut_advance
+
+
+class sut_advance:
+    """Context manager around code of a test that advances the SUT, e.g. 'self.sut.step()'"""
+    def __enter__(self):
+        self.profile = _active_profile
+        if self.profile is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile is not None:
+            self.profile._sut_time += time.perf_counter() - self.start
+
+
+def _element_key(step):
+    return (step.get('modelName'), step.get('name'))
+
+
+class ElementTimes:
+    """Number of steps and seconds per bucket of one element"""
+    def __init__(self):
+        self.count = 0
+        self.seconds = dict.fromkeys(BUCKETS, 0.0)
+
+    @property
+    def total(self):
+        return sum(self.seconds.values())
+
+
+class _ProfiledPlanner:
+    """Planner whose methods in PLANNER_METHODS are timed; other attributes are those of the planner"""
+    def __init__(self, planner, profile):
+        self._planner = planner
+        self._profile = profile
+
+    def __getattr__(self, name):
+        attribute = getattr(self._planner, name) # AttributeError if the planner does not have it, e.g. get_next_steps
+        bucket = PLANNER_METHODS.get(name)
+        if bucket is None or not callable(attribute):
+            return attribute
+        profile = self._profile
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            # Planning is counted for the (first) element that is planned; other requests for the current element
+            if name == 'get_next' and result:
+                profile.current = _element_key(result)
+            elif name == 'get_next_steps' and result:
+                profile.current = _element_key(result[0])
+            profile.add(bucket, seconds)
+            return result
+
+        self.__dict__[name] = timed # Next lookups do not reach __getattr__
+        return timed
+
+
+class _ProfiledExecutor:
+    """Executor whose steps are timed, with the time of sut_advance counted separately"""
+    def __init__(self, executor, profile):
+        self._executor = executor
+        self._profile = profile
+        if hasattr(executor, 'is_empty_step'):
+            self.is_empty_step = self._is_empty_step
+
+    def __getattr__(self, name):
+        return getattr(self._executor, name)
+
+    def _is_empty_step(self, model_name, name):
+        is_empty = self._executor.is_empty_step(model_name, name)
+        if is_empty: # BatchWalker does not execute the step
+            self._profile.current = (model_name, name)
+            self._profile.times(self._profile.current).count += 1
+        return is_empty
+
+    def execute_step(self, model_name, name, data=None):
+        global _active_profile
+        profile = self._profile
+        profile.current = (model_name, name)
+        profile._sut_time = 0.0
+        _active_profile = profile
+        start = time.perf_counter()
+        try:
+            return self._executor.execute_step(model_name, name, data)
+        finally:
+            seconds = time.perf_counter() - start
+            _active_profile = None
+            times = profile.times(profile.current)
+            times.count += 1
+            times.seconds['sut'] += profile._sut_time
+            times.seconds['test'] += seconds - profile._sut_time
+
+
+class StepProfile:
+    """Seconds per bucket ('planner', 'data', 'test', 'sut') for each element (model name, element name)"""
+    def __init__(self):
+        self.elements = {} # (model name, element name): ElementTimes
+        self.current = (None, None) # Element that planner requests are counted for
+        self._sut_time = 0.0
+
+    def planner(self, planner):
+        """:return: the planner, with its requests timed"""
+        return _ProfiledPlanner(planner, self)
+
+    def executor(self, executor):
+        """:return: the executor, with its steps timed"""
+        return _ProfiledExecutor(executor, self)
+
+    def times(self, key):
+        times = self.elements.get(key)
+        if times is None:
+            times = self.elements[key] = ElementTimes()
+        return times
+
+    def add(self, bucket, seconds):
+        self.times(self.current).seconds[bucket] += seconds
+
+    def totals(self):
+        """:return: (dict) seconds per bucket, for all elements together"""
+        return {bucket: sum(times.seconds[bucket] for times in self.elements.values()) for bucket in BUCKETS}
+
+    def table(self):
+        """:return: (str) table with one line per element, with milliseconds per bucket, slowest first"""
+        lines = [f"{'model':<28}{'element':<26}{'count':>9}" + ''.join(f"{bucket + ' [ms]':>14}" for bucket in BUCKETS)
+                 + f"{'total [ms]':>14}"]
+        for (model, name), times in sorted(self.elements.items(), key=lambda item: -item[1].total):
+            lines.append(f"{str(model or '-'):<28}{str(name or '-'):<26}{times.count:>9}"
+                         + ''.join(f"{times.seconds[bucket] * 1e3:>14.2f}" for bucket in BUCKETS)
+                         + f"{times.total * 1e3:>14.2f}")
+        totals = self.totals()
+        lines.append(f"{'total':<54}{sum(times.count for times in self.elements.values()):>9}"
+                     + ''.join(f"{totals[bucket] * 1e3:>14.2f}" for bucket in BUCKETS)
+                     + f"{sum(totals.values()) * 1e3:>14.2f}")
+        return '\n'.join(lines)
+
+    def collapsed_stacks(self):
+        """
+        :return: (list) lines 'model;element;bucket microseconds', the 'collapsed stacks' format of flame graphs
+        """
+        lines = []
+        for (model, name), times in self.elements.items():
+            for bucket in BUCKETS:
+                microseconds = int(round(times.seconds[bucket] * 1e6))
+                if microseconds:
+                    lines.append(f"{model or 'run'};{name or 'between steps'};{bucket} {microseconds}")
+        return lines
+
+    def write_collapsed(self, file):
+        """Write collapsed stacks to a file, e.g. for 'flamegraph.pl profile.folded > profile.svg'"""
+        with open(file, 'w') as f:
+            f.write('\n'.join(self.collapsed_stacks()) + '\n')
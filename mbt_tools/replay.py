@@ -0,0 +1,195 @@
+"""
+Record a walk once, and replay it without GraphWalker, e.g. for regression runs after the SUT was changed.
+WalkRecorder wraps the planner of a walk (an OnlinePlanner or a LocalPlanner) and records the path: the elements
+that were visited, and for every edge with a guard, the values of the graph variables that the guard read.
+While recording, the walk is followed with the guards and actions of the model, so that a recording that is saved
+can be replayed.
+
+    recorder = WalkRecorder(planner, models=[(model_path, stop_condition)])
+    walker = BatchWalker(recorder, executor, reporter)
+    walker.run()
+    recorder.save('walk.json.gz')
+
+ReplayPlanner walks the recorded path in Python. The test package runs as before, and updates the graph variables
+from the SUT; when a recorded guard no longer holds, the SUT has diverged from the recorded walk, and the walk
+stops with a ReplayDivergence:
+
+    walker = replay('walk.json.gz', create_dispatch_executor('tests'), reporter)
+    walker.run()
+"""
+import gzip
+import json
+
+from altwalker.exceptions import GraphWalkerException
+
+from .planner import LocalPlanner, read_models
+from .walker import BatchWalker
+
+RECORDING_VERSION = 1
+
+
+class ReplayDivergence(GraphWalkerException):
+    """The graph variables of a replay do not satisfy the guard of the recorded edge"""
+    def __init__(self, message, step=None, element=None, guard=None, recorded=None, current=None):
+        super().__init__(message)
+        self.step = step
+        self.element = element
+        self.guard = guard
+        self.recorded = recorded
+        self.current = current
+
+
+def _open(file, mode):
+    return gzip.open(file, mode + 't', encoding='utf-8') if file.endswith('.gz') else open(file, mode)
+
+
+def read_recording(file):
+    """:return: (dict) recording written by WalkRecorder.save"""
+    with _open(file, 'r') as f:
+        recording = json.load(f)
+    if recording.get('version') != RECORDING_VERSION:
+        raise ValueError(f"Recording {file} has version {recording.get('version')}, expected {RECORDING_VERSION}.")
+    return recording
+
+
+class ReplayPlanner(LocalPlanner):
+    """
+    LocalPlanner that walks a recorded path instead of choosing edges at random.
+    Guards and actions of the model are evaluated as by LocalPlanner, so the graph variables that the test sets are
+    checked against the guards of the recorded edges.
+    """
+    def __init__(self, recording=None):
+        """:param recording: (dict) of read_recording; or None to follow a path that is appended to 'path'"""
+        super().__init__()
+        self.path = [] # Element ids
+        self.recorded_inputs = {} # Step index: values of the graph variables that the guard read, when recorded
+        if recording is not None:
+            self.load(recording['models'])
+            elements = recording['elements']
+            for step in recording['path']:
+                if isinstance(step, list):
+                    step, inputs = step
+                    self.recorded_inputs[len(self.path)] = inputs
+                self.path.append(elements[step])
+            for key, value in recording['data'].items():
+                self.set_data(key, value)
+
+    def _stop_condition_fulfilled(self):
+        return self.path_length >= len(self.path)
+
+    def _next_element(self):
+        element = self.model.elements[self.path[self.path_length]]
+        if self.current is None:
+            expected = self.model.start
+        elif self.current.is_edge:
+            expected = self.model.elements[self.current.target_id]
+        elif element.id in {edge.id for edge in self.model.out_edges[self.current.id]}:
+            if not self._guard_holds(element):
+                raise self._divergence(element)
+            expected = element
+        else:
+            expected = None
+        if element is not expected:
+            raise GraphWalkerException(f"Recorded step {self.path_length} ('{element.name}') does not follow "
+                                       f"'{self.current.name if self.current else 'start'}' in the model.")
+        return element
+
+    def _divergence(self, edge):
+        recorded = self.recorded_inputs.get(self.path_length)
+        current = {key: self.data.get(key) for key in sorted(edge.guard_reads)}
+        message = f"Replay diverged at step {self.path_length}: guard '{edge.guard}' of '{edge.name}' does not hold. " \
+                  f"Now: {', '.join(f'{key} = {value}' for key, value in current.items())}"
+        if recorded is not None:
+            message += f"; recorded: {', '.join(f'{key} = {value}' for key, value in recorded.items())}"
+        return ReplayDivergence(message, step=self.path_length, element=edge.name, guard=edge.guard,
+                                recorded=recorded, current=current)
+
+
+class WalkRecorder:
+    """
+    Planner that records the steps of another planner. Other attributes are those of the planner.
+    Graph variables that the test execution script sets before the walk should be set on the recorder.
+    """
+    def __init__(self, planner, models=None):
+        """
+        :param planner: planner of the walk, e.g. OnlinePlanner or LocalPlanner
+        :param models: list of tuples (path to .json file, generator), as for the planner; not needed for a
+            LocalPlanner
+        """
+        self._planner = planner
+        self._models_json = read_models(models) if models else planner.models_json
+        if hasattr(planner, 'get_next_steps'):
+            self.get_next_steps = self._get_next_steps
+        self._shadow = ReplayPlanner()
+        self._shadow.load(self._models_json)
+        if isinstance(planner, LocalPlanner):
+            self._shadow.data.update(planner.data)
+        self.restart_recording()
+
+    def __getattr__(self, name):
+        return getattr(self._planner, name)
+
+    ## Recording
+    def restart_recording(self):
+        self._shadow.restart()
+        self._shadow.path = []
+        self._element_indices = {}
+        self._path = []
+        self._initial_data = None
+        self._fail_message = None
+
+    def _follow(self, step):
+        shadow = self._shadow
+        if self._initial_data is None:
+            self._initial_data = dict(shadow.data)
+        element = shadow.model.elements[step['id']]
+        index = self._element_indices.setdefault(element.id, len(self._element_indices))
+        if element.is_edge and element.guard_reads:
+            self._path.append([index, {key: shadow.data.get(key) for key in sorted(element.guard_reads)}])
+        else:
+            self._path.append(index)
+        shadow.path.append(element.id)
+        shadow.get_next() # Checks the guard, and runs the actions of the element
+
+    def recording(self):
+        """:return: (dict) the recorded walk, in the format of read_recording"""
+        return {'version': RECORDING_VERSION, 'models': self._models_json, 'data': self._initial_data or {},
+                'elements': list(self._element_indices), 'path': self._path, 'failed': self._fail_message}
+
+    def save(self, file):
+        """Write the recording to a .json file, compressed with gzip if the name ends with '.gz'"""
+        with _open(file, 'w') as f:
+            json.dump(self.recording(), f, separators=(',', ':'))
+
+    ## Planner
+    def get_next(self):
+        step = self._planner.get_next()
+        self._follow(step)
+        return step
+
+    def _get_next_steps(self, max_steps=100):
+        steps = self._planner.get_next_steps(max_steps)
+        for step in steps:
+            self._follow(step)
+        return steps
+
+    def set_data(self, key, value):
+        self._planner.set_data(key, value)
+        self._shadow.set_data(key, value)
+
+    def restart(self):
+        self._planner.restart()
+        self.restart_recording()
+
+    def fail(self, message):
+        self._planner.fail(message)
+        self._fail_message = message
+
+
+def replay(file, executor, reporter, max_steps=100):
+    """
+    :param file: (str) recording of WalkRecorder.save
+    :param executor: executor with the test package, e.g. create_dispatch_executor("tests")
+    :return: BatchWalker that replays the walk with run(); its planner is a ReplayPlanner
+    """
+    return BatchWalker(ReplayPlanner(read_recording(file)), executor, reporter, max_steps=max_steps)
@@ -0,0 +1,346 @@
+"""
+Reporters for long walks.
+AltWalker's FileReporter opens the file and writes two timestamped lines of text for every step.
+JSONLinesReporter keeps records in memory and hands them in blocks to a writer thread, that appends them to
+a .jsonl file (compressed with gzip if the file name ends with '.gz'). Records can be read with read_records().
+AggregatingReporter writes no record per step: it counts steps, failures and durations per element, in memory
+that does not grow with the length of the walk, and makes a summary per model at tearDownModel.
+
+Record of a step:
+    {"run": 0, "i": 12, "model": "MM1_FIFO_with_s_and_fail", "name": "e_self1", "status": "passed",
+     "duration": 1.2e-05, "data": {"t": 3.41, "q": 1}}
+'data' holds the graph variables that changed since the previous record of the run.
+"""
+import atexit
+import gzip
+import json
+import math
+import queue
+import threading
+import time
+
+from altwalker.reporter import Reporter
+
+
+def _to_json(value):
+    """Convert values that json can not write, such as numpy numbers"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _open(file, mode):
+    if file.endswith('.gz'):
+        return gzip.open(file, mode + 't', encoding='utf-8')
+    return open(file, mode, encoding='utf-8')
+
+
+def read_records(file):
+    """
+    Read the records of a JSONLinesReporter.
+    :param file: path to .jsonl or .jsonl.gz file
+    :return: generator of dicts
+    """
+    with _open(file, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class JSONLinesReporter(Reporter):
+    """
+    Can be registered next to, or instead of, AltWalker's FileReporter:
+
+        reporter_to_file = JSONLinesReporter('output.jsonl.gz') # One reporter for all replications
+        for replication in ...:
+            reporter = Reporting()
+            reporter.register("to file", reporter_to_file)
+            ...
+        reporter_to_file.close()
+    """
+    def __init__(self, file='output.jsonl', buffer_size=10000):
+        """
+        :param file: (str) path to .jsonl file, or .jsonl.gz for a compressed file. An existing file is overwritten.
+        :param buffer_size: (int) number of records that are written in one block
+        """
+        self.file = file
+        self.buffer_size = buffer_size
+        self.num_records = 0
+        self._buffer = []
+        self._run = -1
+        self._index = 0
+        self._data = {} # Graph variables of the previous record of this run
+        self._step_start_time = None
+
+        self._blocks = queue.Queue()
+        self._handle = _open(self.file, 'w')
+        self._writer = threading.Thread(target=self._write_blocks, name='JSONLinesReporter', daemon=True)
+        self._writer.start()
+        atexit.register(self.close) # Records that are still buffered are written at exit
+
+    ## Writer thread
+    def _write_blocks(self):
+        while True:
+            block = self._blocks.get()
+            if block is None:
+                break
+            self._handle.write(''.join(json.dumps(record, default=_to_json) + '\n' for record in block))
+        self._handle.close()
+
+    def _add(self, record):
+        self._buffer.append(record)
+        self.num_records += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered records to the writer thread"""
+        if self._buffer:
+            self._blocks.put(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        """Write all records, and close the file"""
+        if self._writer.is_alive():
+            self.flush()
+            self._blocks.put(None)
+            self._writer.join()
+
+    ## Reporter interface
+    def start(self, message=None):
+        self._run += 1
+        self._index = 0
+        self._data = {}
+        self._add({'run': self._run, 'event': 'start', 'time': time.time(), 'message': message})
+
+    def end(self, message=None, statistics=None, status=None):
+        self._add({'run': self._run, 'event': 'end', 'time': time.time(), 'message': message,
+                   'status': status, 'statistics': statistics})
+        self.flush()
+
+    def step_start(self, step):
+        self._step_start_time = time.perf_counter()
+
+    def step_end(self, step, step_result):
+        duration = time.perf_counter() - self._step_start_time if self._step_start_time is not None else None
+        self._step_start_time = None
+
+        data = step_result.get('data') or {}
+        changed = {key: value for key, value in data.items() if key not in self._data or self._data[key] != value}
+        self._data.update(changed)
+
+        record = {'run': self._run, 'i': self._index, 'model': step.get('modelName'), 'name': step.get('name'),
+                  'status': 'failed' if step_result.get('error') else 'passed', 'duration': duration}
+        if step.get('type') == 'fixture':
+            record['type'] = 'fixture'
+        if changed:
+            record['data'] = changed
+        if step_result.get('error'):
+            record['error'] = step_result['error'].get('message')
+        if step_result.get('output'):
+            record['output'] = step_result['output']
+        self._index += 1
+        self._add(record)
+
+    def error(self, step, message, trace=None):
+        self._add({'run': self._run, 'event': 'error', 'model': step.get('modelName') if step else None,
+                   'name': step.get('name') if step else None, 'message': message, 'trace': trace})
+
+    def report(self):
+        return self.file
+
+
+## Aggregated statistics
+HISTOGRAM_MIN_EXPONENT = -20 # Durations below 2**-20 s (about 1 microsecond) are counted in the first bucket
+HISTOGRAM_NUM_BUCKETS = 32 # Bucket i counts durations in [2**(i-21), 2**(i-20)) s; the last one has no upper bound
+
+
+def histogram_bucket(duration):
+    """:return: (int) index of the histogram bucket of a duration in seconds"""
+    if duration <= 0:
+        return 0
+    exponent = math.frexp(duration)[1] # duration = m * 2**exponent, with 0.5 <= m < 1
+    return min(max(exponent - HISTOGRAM_MIN_EXPONENT, 0), HISTOGRAM_NUM_BUCKETS - 1)
+
+
+class ElementStatistics:
+    """Number of steps, failures and a histogram of durations of one vertex or edge"""
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_duration = 0.0
+        self.min_duration = None
+        self.max_duration = None
+        self.histogram = [0] * HISTOGRAM_NUM_BUCKETS
+
+    def add(self, duration, failed=False):
+        self.count += 1
+        if failed:
+            self.failures += 1
+        if duration is None:
+            return
+        self.total_duration += duration
+        if self.min_duration is None or duration < self.min_duration:
+            self.min_duration = duration
+        if self.max_duration is None or duration > self.max_duration:
+            self.max_duration = duration
+        self.histogram[histogram_bucket(duration)] += 1
+
+    def merge(self, other):
+        """Add the statistics of another ElementStatistics, e.g. of another replication"""
+        self.count += other.count
+        self.failures += other.failures
+        self.total_duration += other.total_duration
+        for attribute, function in (('min_duration', min), ('max_duration', max)):
+            values = [value for value in (getattr(self, attribute), getattr(other, attribute)) if value is not None]
+            setattr(self, attribute, function(values) if values else None)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    def quantile(self, q):
+        """
+        Estimate of a quantile of the durations: the upper bound of the histogram bucket that holds it.
+        :param q: (float) between 0 and 1, e.g. 0.99
+        :return: (float) duration in seconds, or None if no durations were counted
+        """
+        num_durations = sum(self.histogram)
+        if num_durations == 0:
+            return None
+        rank = q * num_durations
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            cumulative += count
+            if cumulative >= rank and count:
+                return min(2.0 ** (index + HISTOGRAM_MIN_EXPONENT), self.max_duration)
+        return self.max_duration
+
+    def to_dict(self):
+        return {'count': self.count, 'failures': self.failures, 'total_duration': self.total_duration,
+                'min_duration': self.min_duration, 'max_duration': self.max_duration,
+                'histogram': {index: count for index, count in enumerate(self.histogram) if count}}
+
+    @classmethod
+    def from_dict(cls, content):
+        statistics = cls()
+        statistics.count = content['count']
+        statistics.failures = content['failures']
+        statistics.total_duration = content['total_duration']
+        statistics.min_duration = content['min_duration']
+        statistics.max_duration = content['max_duration']
+        for index, count in content['histogram'].items():
+            statistics.histogram[int(index)] = count # Keys are strings after a round trip through JSON
+        return statistics
+
+
+def merge_summaries(summaries):
+    """
+    Merge summaries of AggregatingReporter, e.g. of all replications of an experiment.
+    :param summaries: list of summaries (dicts), see AggregatingReporter
+    :return: (dict) summary with the steps of all summaries per model and element, and the number of runs
+    """
+    merged = {}
+    for summary in summaries:
+        model = merged.setdefault(summary['model'], {'model': summary['model'], 'runs': 0, 'elements': {}})
+        model['runs'] += summary.get('runs', 1)
+        for name, content in summary['elements'].items():
+            statistics = ElementStatistics.from_dict(content)
+            if name in model['elements']:
+                model['elements'][name].merge(statistics)
+            else:
+                model['elements'][name] = statistics
+    for model in merged.values():
+        model['elements'] = {name: statistics.to_dict() for name, statistics in model['elements'].items()}
+        model['steps'] = sum(content['count'] for content in model['elements'].values())
+        model['failures'] = sum(content['failures'] for content in model['elements'].values())
+    return list(merged.values())
+
+
+def format_summary(summary):
+    """:return: (str) table with one line per element of a summary, most visited first"""
+    lines = [f"Model {summary['model']}: {summary.get('runs', 1)} run(s), {summary['steps']} steps, "
+             f"{summary['failures']} failed",
+             f"{'element':<30}{'count':>10}{'failed':>8}{'mean [us]':>12}{'p99 [us]':>12}{'max [us]':>12}"]
+    elements = sorted(summary['elements'].items(), key=lambda item: -item[1]['count'])
+    for name, content in elements:
+        statistics = ElementStatistics.from_dict(content)
+        timed = sum(statistics.histogram)
+        mean = statistics.total_duration / timed * 1e6 if timed else float('nan')
+        p99 = (statistics.quantile(0.99) or float('nan')) * 1e6
+        maximum = (statistics.max_duration or float('nan')) * 1e6
+        lines.append(f"{name:<30}{statistics.count:>10}{statistics.failures:>8}{mean:>12.1f}{p99:>12.1f}"
+                     f"{maximum:>12.1f}")
+    return '\n'.join(lines)
+
+
+class AggregatingReporter(Reporter):
+    """
+    Counts the steps of each vertex and edge, instead of reporting each step. At tearDownModel (or at the end of
+    the run, for models without tearDownModel) a summary of the model is added to 'summaries':
+
+        {"run": 0, "model": "MM1_FIFO_with_s_and_fail", "steps": 100000, "failures": 0,
+         "elements": {"e_self1": {"count": 4213, "failures": 0, "total_duration": 0.004, "min_duration": ...,
+                                  "max_duration": ..., "histogram": {"3": 4100, "4": 113}}, ...}}
+
+    The reporter can be shared by all replications; merge_summaries(reporter.summaries) combines them.
+    """
+    def __init__(self, file=None, print_summary=False):
+        """
+        :param file: (str) path to .jsonl file to write every summary to, or None
+        :param print_summary: (bool) print every summary to stdout
+        """
+        self.file = file
+        self.print_summary = print_summary
+        self.summaries = []
+        self._run = -1
+        self._models = {} # Model name: {element name: ElementStatistics}, of the current run
+        self._step_start_time = None
+        if self.file:
+            _open(self.file, 'w').close()
+
+    def _emit(self, model):
+        elements = self._models.pop(model)
+        summary = {'run': self._run, 'model': model,
+                   'steps': sum(statistics.count for statistics in elements.values()),
+                   'failures': sum(statistics.failures for statistics in elements.values()),
+                   'elements': {name: statistics.to_dict() for name, statistics in elements.items()}}
+        self.summaries.append(summary)
+        if self.file:
+            with _open(self.file, 'a') as f:
+                f.write(json.dumps(summary, default=_to_json) + '\n')
+        if self.print_summary:
+            print(format_summary(summary))
+
+    ## Reporter interface
+    def start(self, message=None):
+        self._run += 1
+        self._models = {}
+
+    def end(self, message=None, statistics=None, status=None):
+        for model in list(self._models):
+            self._emit(model)
+
+    def step_start(self, step):
+        self._step_start_time = time.perf_counter()
+
+    def step_end(self, step, step_result):
+        duration = time.perf_counter() - self._step_start_time if self._step_start_time is not None else None
+        self._step_start_time = None
+
+        model = step.get('modelName')
+        elements = self._models.setdefault(model, {})
+        name = step.get('name')
+        if name not in elements:
+            elements[name] = ElementStatistics()
+        elements[name].add(duration, failed=bool(step_result.get('error')))
+
+        if step.get('type') == 'fixture' and name == 'tearDownModel':
+            self._emit(model)
+
+    def error(self, step, message, trace=None):
+        if step and step.get('name'):
+            elements = self._models.setdefault(step.get('modelName'), {})
+            if step['name'] not in elements:
+                elements[step['name']] = ElementStatistics()
+            elements[step['name']].failures += 1
+
+    def report(self):
+        return merge_summaries(self.summaries)
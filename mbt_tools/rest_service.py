@@ -0,0 +1,212 @@
+"""
+Stand-in for the GraphWalker REST service, in Python, for measuring AltWalker without Java.
+It serves the requests that AltWalker's GraphWalkerClient sends (load, hasNext, getNext, getData, setData, restart,
+fail, getStatistics) with the responses of GraphWalker, and walks the model with a LocalPlanner. Graph variables
+are returned as strings, as GraphWalker does.
+The server counts TCP/IP connections and requests, so that clients can be compared:
+
+    with LocalGraphWalkerService(models=[(model_path, stop_condition)]) as gw_service:
+        gw_client = GraphWalkerClient(port=gw_service.port)
+        walker = Walker(OnlinePlanner(client=gw_client), executor, reporter)
+        walker.run()
+        print(gw_service.statistics())
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote
+
+from altwalker.exceptions import GraphWalkerException
+
+from .expressions import compile_action, split_statements
+from .planner import LocalPlanner
+
+
+def format_value(value):
+    """Write a graph variable as GraphWalker does in 'getData': as a string, with JavaScript literals"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) # JavaScript has one number type: 2.0 is written as 2
+    return str(value)
+
+
+def _parse_literal(text):
+    """:return: (tuple) (True, value) if text is a JavaScript literal, else (False, None)"""
+    try:
+        return True, json.loads(text)
+    except ValueError:
+        return False, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, as GraphWalker's service (Jetty)
+    wbufsize = 65536 # Headers and body are sent together when the response is flushed
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass # No line on stderr per request
+
+    def _respond(self, body, status=200):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self, method):
+        self.server.count('requests')
+        path = self.path.split('?')[0]
+        if not path.startswith('/graphwalker/'):
+            self._respond({'result': 'nok', 'error': f"Unknown path {path}"}, status=404)
+            return
+        command, _, argument = path[len('/graphwalker/'):].partition('/')
+        body = None
+        if self.headers.get('Content-Length'):
+            body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        try:
+            with self.server.lock: # Requests of several connections are handled one at a time
+                result = self.server.service.handle(method, command, unquote(argument), body)
+        except (GraphWalkerException, KeyError, ValueError) as error:
+            self._respond({'result': 'nok', 'error': str(error)})
+            return
+        if result is None:
+            self._respond({'result': 'nok', 'error': f"Unknown request {method} /{command}"}, status=404)
+            return
+        result['result'] = 'ok'
+        self._respond(result)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, _Handler)
+        self.service = service
+        self.lock = threading.Lock()
+        self.counts = {'connections': 0, 'requests': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+
+class LocalGraphWalkerService:
+    """
+    Can be used instead of AltWalker's GraphWalkerService: it has a port, and is stopped with kill().
+    The service runs in a thread of this Python process.
+    """
+    def __init__(self, models=None, port=0, host='127.0.0.1', seed=None):
+        """
+        :param models: list of tuples (path to .json file, generator), as for GraphWalkerService; or None to
+            load the models later with a 'load' request
+        :param port: (int) port, or 0 for a free port chosen by the OS
+        :param seed: seed for the random choices of the path generator
+        """
+        self.planner = LocalPlanner(models=models, seed=seed)
+        self._server = _Server((host, port), self)
+        self.host = host
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='LocalGraphWalkerService',
+                                        daemon=True)
+        self._thread.start()
+
+    ## Requests
+    def handle(self, method, command, argument, body):
+        """:return: (dict) body of the response without 'result', or None for an unknown request"""
+        planner = self.planner
+        if planner.model is None and command != 'load':
+            raise GraphWalkerException("No model has been loaded.")
+        if method == 'GET' and command == 'hasNext':
+            return {'hasNext': 'true' if planner.has_next() else 'false'}
+        if method == 'GET' and command == 'getNext':
+            step = planner.get_next()
+            return {'currentElementID': step['id'], 'currentElementName': step['name'],
+                    'modelName': step['modelName'], 'properties': step.get('properties', {}),
+                    'data': [{key: format_value(value)} for key, value in planner.data.items()]}
+        if method == 'GET' and command == 'getData':
+            return {'data': {key: format_value(value) for key, value in planner.data.items()}}
+        if method == 'PUT' and command == 'setData':
+            self.set_data(argument)
+            return {}
+        if method == 'PUT' and command == 'restart':
+            planner.restart()
+            return {}
+        if method == 'PUT' and command == 'fail':
+            planner.fail(argument)
+            return {}
+        if method == 'GET' and command == 'getStatistics':
+            return planner.get_statistics()
+        if method == 'POST' and command == 'load':
+            planner.load(json.loads(body))
+            return {}
+        return None
+
+    def set_data(self, script):
+        """Run a 'setData' script, e.g. 'q=1;' or 't=2.5;s=0;'"""
+        for statement in split_statements(script):
+            key, _, value = statement.partition('=')
+            is_literal, value = _parse_literal(value.strip())
+            if key.strip().isidentifier() and is_literal: # Fast path for 'name=literal'
+                self.planner.set_data(key.strip(), value)
+                continue
+            function, reads, writes = compile_action(statement, label='<setData>')
+            data = dict(self.planner.data)
+            function(data)
+            for key in writes:
+                self.planner.set_data(key, data[key])
+
+    ## Service
+    def statistics(self):
+        """:return: (dict) number of TCP/IP connections that were opened, and number of requests"""
+        return dict(self._server.counts)
+
+    def kill(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.kill()
+
+
+def main(argv=None):
+    """Run the stand-in as a service on its own, like 'gw online --service RESTFUL': python -m mbt_tools.rest_service"""
+    parser = argparse.ArgumentParser(description="Python stand-in for the GraphWalker REST service")
+    parser.add_argument('--port', type=int, default=8887)
+    parser.add_argument('--model', nargs=2, action='append', metavar=('PATH', 'GENERATOR'),
+                        help="model to load at start, e.g. --model models/MM1.json \"random(length(100))\"")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    service = LocalGraphWalkerService(models=args.model, port=args.port, seed=args.seed)
+    print(f"Serving the GraphWalker REST API on http://{service.host}:{service.port}/graphwalker")
+    try:
+        service._thread.join()
+    except KeyboardInterrupt:
+        service.kill()
+
+
+if __name__ == '__main__':
+    main()
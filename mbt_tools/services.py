@@ -0,0 +1,238 @@
+"""
+GraphWalker services with leased ports, that do not outlive the run that started them.
+The test execution scripts used fixed ports (6000, plus one for every run), and the Java process of a service
+kept running when a script crashed before gw_service.kill(). ManagedGraphWalkerService:
+- leases a free port from a range: the port is checked with the OS, and a lease file prevents that other
+  processes on the same computer take the same port;
+- registers the process id of the Java process in the lease file;
+- is killed by a context manager, at exit of Python, and when the script gets SIGINT or SIGTERM;
+- reaps services of earlier runs whose Python process is no longer running, when the first service is started.
+"""
+import atexit
+import json
+import os
+import signal
+import socket
+import tempfile
+import time
+
+import psutil
+
+from altwalker.exceptions import GraphWalkerException
+from altwalker.graphwalker import GraphWalkerService
+
+REGISTRY_DIRECTORY = os.path.join(tempfile.gettempdir(), 'mbt_tools_graphwalker') # Lease files, one per port
+PORT_RANGE = (6000, 7000) # Ports that are leased, including the first and excluding the last
+STALE_LEASE_SECONDS = 10 # Age after which a lease file that can not be read is left by a process that died
+
+_running_services = [] # Services started by this Python process that have not been killed
+_handlers_installed = False
+_previous_handlers = {} # Signal handlers that were set before _install_handlers
+
+
+## Processes
+def _process_info(pid):
+    """(dict) process id and creation time, that together identify a process even if the id is reused"""
+    return {'pid': pid, 'create_time': psutil.Process(pid).create_time()}
+
+
+def _is_running(info):
+    if not info:
+        return False
+    try:
+        return psutil.Process(info['pid']).create_time() == info['create_time']
+    except psutil.Error:
+        return False
+
+
+def _kill_process_tree(info):
+    """Kill a registered process and its children, if it is still the same process"""
+    if not _is_running(info):
+        return
+    try:
+        process = psutil.Process(info['pid'])
+        for child in process.children(recursive=True):
+            child.kill()
+        process.kill()
+        process.wait(1)
+    except psutil.Error:
+        pass
+
+
+## Ports
+def port_is_free(port, host='127.0.0.1'):
+    """Ask the OS if a port can be bound"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+class PortLease:
+    """
+    A port that is reserved for one GraphWalker service, by a lease file in REGISTRY_DIRECTORY.
+    The lease file holds the process ids of the owner (this Python process) and of the service.
+    """
+    def __init__(self, port):
+        self.port = port
+        self.path = os.path.join(REGISTRY_DIRECTORY, f'port-{port}.json')
+        self.content = {'port': port, 'owner': _process_info(os.getpid()), 'service': None}
+
+    def acquire(self):
+        """:return: (bool) True if the lease file was created, False if the port is leased by another process"""
+        os.makedirs(REGISTRY_DIRECTORY, exist_ok=True)
+        try:
+            os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)) # Reserves the port, atomically
+        except FileExistsError:
+            return False
+        self._write()
+        return True
+
+    def register_service(self, pid):
+        self.content['service'] = _process_info(pid)
+        self._write()
+
+    def _write(self):
+        # The content is replaced atomically, so a crash while writing does not leave a truncated lease
+        temporary_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.content, f)
+        os.replace(temporary_path, self.path)
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def lease_port(port_range=PORT_RANGE, host='127.0.0.1'):
+    """
+    Lease the first port in a range that is free, and not leased by another process.
+    :param port_range: tuple (first port, last port + 1)
+    :return: PortLease
+    """
+    for port in range(*port_range):
+        if not port_is_free(port, host):
+            continue
+        lease = PortLease(port)
+        if lease.acquire():
+            return lease
+    raise GraphWalkerException(f"No free port for a GraphWalker service in range {port_range}.")
+
+
+def reap_stale_services():
+    """
+    Kill GraphWalker services of earlier runs, whose owner process is no longer running, and remove their leases.
+    :return: (int) number of leases that were removed
+    """
+    if not os.path.isdir(REGISTRY_DIRECTORY):
+        return 0
+    num_reaped = 0
+    for name in os.listdir(REGISTRY_DIRECTORY):
+        path = os.path.join(REGISTRY_DIRECTORY, name)
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            # Lease file that is being written, or removed; or that was left empty by a process that died
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_LEASE_SECONDS:
+                    os.remove(path)
+                    num_reaped += 1
+            except OSError:
+                pass
+            continue
+        if _is_running(content.get('owner')):
+            continue
+        _kill_process_tree(content.get('service'))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        num_reaped += 1
+    return num_reaped
+
+
+## Clean up
+def kill_all_services():
+    """Kill all services that were started by this Python process"""
+    for service in list(_running_services):
+        service.kill()
+
+
+def _handle_signal(signum, frame):
+    kill_all_services()
+    handler = _previous_handlers.get(signum)
+    if callable(handler):
+        handler(signum, frame)
+    else: # Default action of the signal, e.g. end the process
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+def _install_handlers():
+    global _handlers_installed
+    if _handlers_installed:
+        return
+    _handlers_installed = True
+    reap_stale_services()
+    atexit.register(kill_all_services)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            _previous_handlers[signum] = signal.signal(signum, _handle_signal)
+        except ValueError:
+            pass # Signal handlers can only be set in the main thread
+
+
+class ManagedGraphWalkerService(GraphWalkerService):
+    """
+    GraphWalkerService on a leased port, that is killed when the script ends or crashes.
+    Can be used instead of AltWalker's GraphWalkerService, and as a context manager:
+
+        with ManagedGraphWalkerService(models=[(model_path, stop_condition)]) as gw_service:
+            gw_client = PooledGraphWalkerClient(port=gw_service.port)
+            ...
+    """
+    def __init__(self, models=None, port=None, port_range=PORT_RANGE, output_file=None, max_attempts=3, **kwargs):
+        """
+        :param port: (int) port to use, or None to lease a free port from port_range
+        :param output_file: (str) log file of the service, default: 'graphwalker-service-<port>.log'
+        :param max_attempts: (int) number of ports to try, if a leased port is taken before Java binds it
+        """
+        _install_handlers()
+        for attempt in range(max_attempts):
+            if port is None:
+                self.lease = lease_port(port_range)
+            else:
+                self.lease = PortLease(port)
+                if not self.lease.acquire():
+                    raise GraphWalkerException(f"Port {port} is leased by another GraphWalker service.")
+            try:
+                super().__init__(models=models, port=self.lease.port,
+                                 output_file=output_file or f'graphwalker-service-{self.lease.port}.log', **kwargs)
+                break
+            except GraphWalkerException:
+                self.lease.release()
+                if port is not None or attempt == max_attempts - 1:
+                    raise
+        _running_services.append(self)
+
+    def _read_logs(self):
+        # Called by GraphWalkerService when the process has been started: register it before waiting for it
+        self.lease.register_service(self._process.pid)
+        super()._read_logs()
+
+    def kill(self):
+        super().kill()
+        self.lease.release()
+        if self in _running_services:
+            _running_services.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.kill()
@@ -0,0 +1,137 @@
+"""
+Walker that executes several planned steps per request to the planner.
+AltWalker's Walker asks the planner for every single step: 'hasNext', 'getNext', 'getData' and a 'setData'
+for every graph variable that the test changed. BatchWalker takes a run of steps at once from planners that
+can plan ahead (LocalPlanner.get_next_steps), passes graph variables from step to step itself, and sends the
+changes of the test to the planner once per run of steps.
+Other planners, such as AltWalker's OnlinePlanner, are asked for one step at a time.
+"""
+from altwalker.exceptions import GraphWalkerException
+from altwalker.walker import Walker
+
+
+class BatchWalker(Walker):
+    """
+    Drop-in replacement for AltWalker's Walker:
+
+        planner = LocalPlanner(models=[(model_path, stop_condition)])
+        walker = BatchWalker(planner, executor, reporter)
+        walker.run()
+    """
+    def __init__(self, planner, executor, reporter, max_steps=100):
+        """
+        :param max_steps: (int) maximum number of steps that are planned at once
+        """
+        super().__init__(planner, executor, reporter)
+        self.max_steps = max_steps
+        self.num_batches = 0
+        self._data = None # Graph variables during a run of steps
+        self._changes = {} # Graph variables changed by the test, not yet sent to the planner
+        self._is_empty_step = getattr(executor, 'is_empty_step', None) # See DispatchExecutor
+
+    def _next_steps(self):
+        if hasattr(self._planner, 'get_next_steps'):
+            return self._planner.get_next_steps(self.max_steps)
+        step = self._planner.get_next()
+        step['data'] = self._planner.get_data()
+        return [step]
+
+    def _flush(self):
+        """Send graph variables that were changed by the test to the planner"""
+        for key, value in self._changes.items():
+            self._planner.set_data(key, value)
+        self._changes = {}
+        self._data = None
+
+    def _start_run(self):
+        """Restart the planner and the executor, and run setUpRun. :return: (bool) status"""
+        self._planner.restart()
+        self._executor.reset()
+        return self._setUpRun()
+
+    def _end_of_batch(self):
+        """Called after the changes of a run of steps have been sent to the planner, see 'checkpoint'"""
+
+    def __iter__(self):
+        self._reporter.start()
+        self._status = self._start_run()
+
+        # if setUpRun failed stop
+        if not self._status:
+            self._reporter.end(statistics=self._planner.get_statistics(), status=self._status)
+            return
+
+        while self._status and self._planner.has_next():
+            try:
+                steps = self._next_steps()
+            except GraphWalkerException as ex:
+                self._reporter.error(None, str(ex))
+                self._status = False
+                break
+            self.num_batches += 1
+
+            self._data = {}
+            for step in steps:
+                assigned = step.pop('data', {})
+                self._data.update(assigned)
+                for key in assigned: # Assigned by the model after the test changed it
+                    self._changes.pop(key, None)
+
+                if step["modelName"] not in self._models:
+                    self._status = self._setUpModel(step["modelName"])
+
+                    # if setUpModel failed stop executing steps
+                    if not self._status:
+                        break
+
+                if not step.get("name"):
+                    continue
+
+                self._status = self._run_step(step)
+                step["status"] = self._status
+
+                yield step
+
+                if not self._status:
+                    break
+            self._flush()
+            if self._status:
+                self._end_of_batch()
+
+        status = self._tearDownModels()
+        self._status = self._status & status
+
+        status = self._tearDownRun()
+        self._status = self._status & status
+
+        self._reporter.end(statistics=self._planner.get_statistics(), status=self._status)
+
+    def _execute_step(self, step):
+        if self._data is None: # Fixtures outside a run of steps are executed as by AltWalker's Walker
+            return super()._execute_step(step)
+
+        if self._is_empty_step is not None and self._is_empty_step(step.get("modelName"), step.get("name")):
+            # Fast path: the test method does nothing, so the graph variables do not change
+            self._reporter.step_start(step)
+            self._reporter.step_end(step, {"output": ""})
+            return True
+
+        data_before = dict(self._data)
+
+        self._reporter.step_start(step)
+        step_result = self._executor.execute_step(step.get("modelName"), step.get("name"), data_before)
+        self._reporter.step_end(step, step_result)
+
+        data_after = step_result.get("data")
+        if data_after:
+            for key, value in data_after.items():
+                if key not in data_before or data_before[key] != value:
+                    self._data[key] = value
+                    self._changes[key] = value
+
+        error = step_result.get("error")
+        if error:
+            self._flush()
+            self._planner.fail(error["message"])
+
+        return error is None